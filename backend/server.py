@@ -1,35 +1,303 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Form, Header, Request, Response, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 import os
+import re
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 import base64
 import io
 import mimetypes
+import multiprocessing
 import asyncio
-from bson import ObjectId
-import gridfs
-from pymongo import MongoClient
+import anyio
+import bisect
+import threading
+import numpy as np
+import orjson
+from bson import ObjectId, Binary
+from pymongo import ReturnDocument, IndexModel, ASCENDING, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from gridfs.errors import NoFile
+import hashlib
+import math
+import struct
+import tarfile
+import unicodedata
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics: counters, gauges and histograms kept in process and rendered in
+# the Prometheus text format on /api/metrics. Driver listeners report from
+# pymongo's threads, so every metric guards its values with a lock.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(64 * 1024 * 4 ** i for i in range(8))  # 64 KiB to 1 GiB
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values)) + "}"
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, value in self.snapshot():
+            lines.append(f"{self.name}{format_labels(self.labels, values)} {value}")
+        return lines
+
+class CounterMetric(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+class GaugeMetric(CounterMetric):
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), collect=None):
+        super().__init__(name, help, labels)
+        # collect() returns {label values: value} and is read at scrape time
+        self.collect = collect
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def snapshot(self) -> list:
+        if self.collect is not None:
+            return sorted(self.collect().items())
+        return super().snapshot()
+
+class HistogramMetric(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, amount: float, *labels):
+        index = bisect.bisect_left(self.buckets, amount)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += amount
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return sorted((values, (list(counts), total)) for values, (counts, total) in self._values.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        names = self.labels + ("le",)
+        for values, (counts, total) in self.snapshot():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(names, values + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+class ThroughputMeter:
+    """Bytes per second over a sliding window of one-second buckets."""
+
+    def __init__(self, window_seconds: int = 60):
+        self.window_seconds = window_seconds
+        self._buckets = deque()  # [second, bytes]
+        self._lock = threading.Lock()
+
+    def add(self, amount: int):
+        second = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += amount
+            else:
+                self._buckets.append([second, amount])
+                while self._buckets[0][0] <= second - self.window_seconds:
+                    self._buckets.popleft()
+
+    def rate(self) -> float:
+        cutoff = int(time.monotonic()) - self.window_seconds
+        with self._lock:
+            return sum(amount for second, amount in self._buckets if second > cutoff) / self.window_seconds
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+response_throughput = ThroughputMeter()
+HTTP_REQUESTS = metrics.add(CounterMetric(
+    "skiza_http_requests_total", "HTTP requests handled", ("method", "route", "status")))
+HTTP_REQUEST_SECONDS = metrics.add(HistogramMetric(
+    "skiza_http_request_duration_seconds", "Time from request to last response byte", ("method", "route")))
+HTTP_REQUESTS_IN_FLIGHT = metrics.add(GaugeMetric(
+    "skiza_http_requests_in_flight", "Requests currently being handled"))
+HTTP_RESPONSES_IN_FLIGHT = metrics.add(GaugeMetric(
+    "skiza_http_responses_in_flight", "Responses currently sending their body, e.g. open audio streams", ("route",)))
+HTTP_RESPONSE_BYTES = metrics.add(CounterMetric(
+    "skiza_http_response_bytes_total", "Response body bytes sent", ("route",)))
+metrics.add(GaugeMetric(
+    "skiza_http_response_bytes_per_second", f"Response body throughput over the last {response_throughput.window_seconds}s",
+    collect=lambda: {(): response_throughput.rate()}))
+STORAGE_READ_SECONDS = metrics.add(HistogramMetric(
+    "skiza_storage_read_seconds", "Time to read one chunk from blob storage", ("storage",)))
+UPLOAD_BYTES = metrics.add(HistogramMetric(
+    "skiza_upload_size_bytes", "Size of uploaded audio files", buckets=SIZE_BUCKETS))
+MONGO_COMMAND_SECONDS = metrics.add(HistogramMetric(
+    "skiza_mongo_command_duration_seconds", "MongoDB command round-trip time", ("command",)))
+MONGO_COMMAND_FAILURES = metrics.add(CounterMetric(
+    "skiza_mongo_command_failures_total", "MongoDB commands that returned an error", ("command",)))
+MONGO_POOL_CONNECTIONS = metrics.add(GaugeMetric(
+    "skiza_mongo_pool_connections", "MongoDB pool connections by state", ("state",)))
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+        MONGO_COMMAND_FAILURES.inc(event.command_name)
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.inc("open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.dec("open")
+
+    def connection_check_out_started(self, event):
+        MONGO_POOL_CONNECTIONS.inc("waiting")
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CONNECTIONS.dec("waiting")
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.dec("waiting")
+        MONGO_POOL_CONNECTIONS.inc("in_use")
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.dec("in_use")
+
+class MetricsMiddleware:
+    """Plain ASGI middleware, so streaming bodies pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500  # Unless a response starts, the request failed
+        route = None
+        sent = 0
+
+        def route_of() -> str:
+            # The router records the matched route in the scope
+            matched = scope.get("route")
+            return getattr(matched, "path", None) or "unmatched"
+
+        async def send_with_metrics(message):
+            nonlocal status, route, sent
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                status = message["status"]
+                route = route_of()
+                HTTP_RESPONSES_IN_FLIGHT.inc(route)
+            elif message_type == "http.response.body":
+                size = len(message.get("body", b""))
+                sent += size
+                response_throughput.add(size)
+            elif message_type == "http.response.zerocopysend":
+                size = message["count"]
+                sent += size
+                response_throughput.add(size)
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            if route is not None:
+                HTTP_RESPONSES_IN_FLIGHT.dec(route)
+            else:
+                route = route_of()
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route)
+            HTTP_REQUESTS.inc(scope["method"], route, str(status))
+            if sent:
+                HTTP_RESPONSE_BYTES.inc(route, amount=sent)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(), MongoPoolMetrics()])
 db = client[os.environ['DB_NAME']]
 
-# GridFS for file storage
-sync_client = MongoClient(mongo_url)
-sync_db = sync_client[os.environ['DB_NAME']]
-fs = gridfs.GridFS(sync_db)
+# GridFS for file storage (async bucket shares the Motor client and event loop)
+fs = AsyncIOMotorGridFSBucket(db)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -46,33 +314,1967 @@ class AudioMetadata(BaseModel):
     file_size: int
     mime_type: str
     upload_date: datetime = Field(default_factory=datetime.utcnow)
-    file_id: str  # GridFS file id
+    file_id: str  # Blob id within the storage backend
+    storage: str = "gridfs"  # Backend holding the bytes
+    content_hash: Optional[str] = None  # sha256 of the stored bytes
+    codec: Optional[str] = None
+    bitrate: Optional[int] = None  # Bits per second
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    processing: str = "done"  # pending, done or failed; see the jobs collection
+    is_podcast: bool = False
+
+class AudioMetadataCreate(BaseModel):
+    title: str
+    artist: Optional[str] = None
+    duration: Optional[float] = None
+    is_podcast: bool = False
+
+class AudioProbeResult(BaseModel):
+    container: Optional[str] = None
+    codec: Optional[str] = None
+    mime_type: Optional[str] = None
+    duration: Optional[float] = None
+    bitrate: Optional[int] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bits_per_sample: Optional[int] = None
+    data_offset: Optional[int] = None  # Start of PCM samples in WAV files
+    data_size: Optional[int] = None
+
+class StoredBlob(BaseModel):
+    storage: str = "gridfs"
+    file_id: str
+    file_size: int
+    content_hash: str
+    probe: AudioProbeResult
+    deduplicated: bool = False  # Reused an existing copy of the same bytes
+
+class Job(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    audio_id: str
+    type: str
+    status: str = "queued"  # queued, running, done or failed
+    payload: dict = {}
+    attempts: int = 0
+    max_attempts: int = 3
+    error: Optional[str] = None
+    owner: Optional[str] = None  # Process running the job
+    lease_expires: Optional[datetime] = None  # Renewed by the owner's heartbeat
+    created_date: datetime = Field(default_factory=datetime.utcnow)
+    updated_date: datetime = Field(default_factory=datetime.utcnow)
+
+class UploadSessionCreate(BaseModel):
+    title: str
+    filename: str
+    content_type: str
+    artist: Optional[str] = None
+    duration: Optional[float] = None
     is_podcast: bool = False
 
-class AudioMetadataCreate(BaseModel):
-    title: str
-    artist: Optional[str] = None
-    duration: Optional[float] = None
-    is_podcast: bool = False
+class UploadSession(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    title: str
+    filename: str
+    content_type: str
+    artist: Optional[str] = None
+    duration: Optional[float] = None
+    is_podcast: bool = False
+    received_chunks: List[int] = []  # Chunk indexes stored so far
+    received_bytes: int = 0
+    created_date: datetime = Field(default_factory=datetime.utcnow)
+
+class BulkUploadResult(BaseModel):
+    filename: Optional[str] = None
+    success: bool
+    audio: Optional[AudioMetadata] = None
+    error: Optional[str] = None
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[str]
+
+class BulkDeleteFailure(BaseModel):
+    id: str
+    error: str
+
+class BulkDeleteResult(BaseModel):
+    deleted: List[str] = []
+    not_found: List[str] = []
+    failed: List[BulkDeleteFailure] = []
+
+class ImportResult(BaseModel):
+    audio_imported: int = 0
+    audio_skipped: int = 0  # Ids already present in this database
+    playlists_imported: int = 0
+    playlists_skipped: int = 0
+    peaks_imported: int = 0
+    blobs_stored: int = 0
+    blobs_existing: int = 0  # Content already held here, not stored again
+
+class TopTrack(BaseModel):
+    audio: AudioMetadata
+    plays: int = 0
+    seconds_listened: float = 0.0
+    bytes_served: int = 0
+    last_played: Optional[datetime] = None
+
+class PlaylistItem(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    title: str
+    audio_items: List[str] = []  # List of audio IDs
+    created_date: datetime = Field(default_factory=datetime.utcnow)
+    updated_date: datetime = Field(default_factory=datetime.utcnow)  # Set by every update; Last-Modified
+    # Denormalized totals, kept in step with audio_items by every update
+    track_count: int = 0
+    total_duration: float = 0.0
+    total_bytes: int = 0
+
+class PlaylistSummary(BaseModel):
+    id: str
+    title: str
+    created_date: datetime
+    updated_date: Optional[datetime] = None
+    track_count: int = 0
+    total_duration: float = 0.0
+    total_bytes: int = 0
+
+class PlaylistCreate(BaseModel):
+    title: str
+    audio_items: List[str] = []
+
+class PlaylistTracksAdd(BaseModel):
+    audio_ids: List[str] = Field(min_length=1)
+    position: Optional[int] = Field(None, ge=0)  # Appended when omitted
+
+class PlaylistTrackMove(BaseModel):
+    from_position: int = Field(ge=0)
+    to_position: int = Field(ge=0)
+
+class PlaylistTrack(BaseModel):
+    position: int
+    audio_id: str
+    missing: bool = False  # Audio was deleted after being added
+    audio: Optional[AudioMetadata] = None
+
+class AudioSearchPage(BaseModel):
+    query: str
+    total: int
+    offset: int
+    limit: int
+    results: List[AudioMetadata]
+
+class PlaylistTracksPage(BaseModel):
+    playlist_id: str
+    title: str
+    total: int
+    offset: int
+    limit: int
+    tracks: List[PlaylistTrack]
+
+# Index bootstrap: every query pattern the API uses is declared here and
+# created at startup, so lookups never fall back to collection scans
+UPLOAD_SESSION_TTL = int(float(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24)) * 3600)  # Abandoned uploads expire
+
+INDEX_SPECS = {
+    "audio_metadata": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("upload_date", ASCENDING), ("id", ASCENDING)], name="upload_date_id"),
+        IndexModel(
+            [("is_podcast", ASCENDING), ("upload_date", ASCENDING), ("id", ASCENDING)],
+            name="is_podcast_upload_date_id"
+        ),
+        IndexModel(
+            [("artist", ASCENDING), ("upload_date", ASCENDING), ("id", ASCENDING)],
+            name="artist_upload_date_id"
+        ),
+        IndexModel([("title", ASCENDING)], name="title"),
+    ],
+    "audio_blobs": [
+        IndexModel([("content_hash", ASCENDING)], name="content_hash_unique", unique=True),
+        IndexModel([("file_id", ASCENDING)], name="file_id_unique", unique=True),
+    ],
+    "audio_peaks": [
+        IndexModel([("content_hash", ASCENDING)], name="content_hash_unique", unique=True),
+    ],
+    "audio_hls": [
+        IndexModel([("content_hash", ASCENDING)], name="content_hash_unique", unique=True),
+    ],
+    "play_stats": [
+        IndexModel([("audio_id", ASCENDING)], name="audio_id_unique", unique=True),
+        IndexModel([("plays", ASCENDING), ("audio_id", ASCENDING)], name="plays_audio_id"),
+        IndexModel([("seconds_listened", ASCENDING), ("audio_id", ASCENDING)], name="seconds_listened_audio_id"),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("audio_id", ASCENDING), ("status", ASCENDING)], name="audio_id_status"),
+        IndexModel([("status", ASCENDING), ("created_date", ASCENDING)], name="status_created_date"),
+        IndexModel([("status", ASCENDING), ("lease_expires", ASCENDING)], name="status_lease_expires"),
+    ],
+    "playlists": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_date", ASCENDING), ("id", ASCENDING)], name="created_date_id"),
+        IndexModel([("audio_items", ASCENDING)], name="audio_items"),
+    ],
+    "upload_sessions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_date", ASCENDING)], name="created_date_ttl", expireAfterSeconds=UPLOAD_SESSION_TTL),
+    ],
+    "upload_chunks": [
+        IndexModel([("upload_id", ASCENDING), ("index", ASCENDING)], name="upload_id_index", unique=True),
+        IndexModel([("created_date", ASCENDING)], name="created_date_ttl", expireAfterSeconds=UPLOAD_SESSION_TTL),
+    ],
+}
+
+# Outcome of the last ensure_indexes() run, keyed by "collection.index_name"
+index_build_status = {}
+
+async def ensure_indexes():
+    for collection_name, models in INDEX_SPECS.items():
+        for model in models:
+            name = model.document["name"]
+            key = f"{collection_name}.{name}"
+            started = time.perf_counter()
+            try:
+                await db[collection_name].create_indexes([model])
+                index_build_status[key] = {
+                    "status": "ready",
+                    "build_ms": round((time.perf_counter() - started) * 1000, 2)
+                }
+            except Exception as e:
+                # A failed build (e.g. duplicate ids blocking a unique index)
+                # must not stop the API from starting
+                logger.error("Index %s failed to build: %s", key, e)
+                index_build_status[key] = {"status": "failed", "error": str(e)}
+
+# Metadata cache: audio documents are immutable once uploaded, so hot lookups
+# are served from memory and only delete/update paths need to invalidate
+class MetadataCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # audio_id -> (expires_at, document)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, audio_id: str) -> Optional[dict]:
+        entry = self._entries.get(audio_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[audio_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(audio_id)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, audio_id: str, document: dict):
+        self._entries[audio_id] = (time.monotonic() + self.ttl_seconds, document)
+        self._entries.move_to_end(audio_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, audio_id: str):
+        self._entries.pop(audio_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+metadata_cache = MetadataCache(
+    max_entries=int(os.environ.get('METADATA_CACHE_SIZE', 10000)),
+    ttl_seconds=float(os.environ.get('METADATA_CACHE_TTL', 300))
+)
+
+async def get_audio_meta(audio_id: str) -> Optional[dict]:
+    # Cached documents are shared between requests; callers must not mutate them
+    audio_meta = metadata_cache.get(audio_id)
+    if audio_meta is None:
+        audio_meta = await db.audio_metadata.find_one({"id": audio_id}, {"_id": 0})
+        if audio_meta is not None:
+            metadata_cache.set(audio_id, audio_meta)
+    return audio_meta
+
+# Catalogue search: an in-process inverted index over title and artist
+# tokens. Tokens are kept sorted so a typeahead prefix maps to one contiguous
+# range. Uploads and deletes in this process update it immediately; a
+# background refresh picks up documents inserted by other workers, and ids
+# deleted elsewhere are dropped when a result page finds them missing.
+SEARCH_REFRESH_SECONDS = float(os.environ.get('SEARCH_REFRESH_SECONDS', 30))
+SEARCH_READY_TIMEOUT = 10  # Seconds a request waits for the initial load
+# Refreshes resume by _id, which orders documents by insert time rather than
+# upload_date (imports keep their original dates). ObjectIds are made by each
+# worker before the insert lands, so a refresh re-reads this many seconds
+# before the last one it saw to cover clock skew and slow inserts.
+SEARCH_REFRESH_OVERLAP = 120
+SEARCH_FIELDS = {"_id": 1, "id": 1, "title": 1, "artist": 1, "upload_date": 1, "is_podcast": 1}
+
+def normalize_text(text: Optional[str]) -> str:
+    # Case- and accent-insensitive: "Beyoncé" matches "beyonce"
+    if not text or text.isascii():
+        return (text or "").lower()
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return re.findall(r"\w+", normalize_text(text))
+
+class SearchIndex:
+    """Inverted index with numpy scoring, so broad prefixes rank in milliseconds.
+
+    Each track gets a document number; postings map tokens to sets of those
+    numbers and per-document data lives in arrays indexed by them.
+    """
+
+    def __init__(self):
+        self._numbers = {}  # audio_id -> document number
+        self._ids = []  # document number -> audio_id, None once removed
+        self._keys = []  # document number -> (title tokens, artist tokens, title)
+        self._uploaded = np.zeros(1024)
+        self._podcast = np.zeros(1024, bool)
+        self._title = {}  # token -> document numbers with it in the title
+        self._artist = {}  # token -> document numbers with it in the artist
+        self._first = {}  # first title token -> document numbers
+        self._exact = {}  # whole normalized title -> document numbers
+        self._tokens = []  # Sorted tokens of _title and _artist
+        self._sorted = True
+        self.ready = asyncio.Event()
+        self.last_seen = None  # Highest _id read from the database, where refreshes resume
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    def _other_words(self, postings: dict) -> Optional[dict]:
+        # Title and artist words share the sorted token list
+        if postings is self._title:
+            return self._artist
+        if postings is self._artist:
+            return self._title
+        return None
+
+    def _post(self, postings: dict, key: str, number: int):
+        numbers = postings.get(key)
+        if numbers is None:
+            numbers = postings[key] = set()
+            other = self._other_words(postings)
+            if other is not None and key not in other:
+                if self._sorted:
+                    bisect.insort(self._tokens, key)
+                else:
+                    self._tokens.append(key)
+        numbers.add(number)
+
+    def _unpost(self, postings: dict, key: str, number: int):
+        numbers = postings[key]
+        numbers.discard(number)
+        if not numbers:
+            del postings[key]
+            other = self._other_words(postings)
+            if other is not None and key not in other:
+                if self._sorted:
+                    del self._tokens[bisect.bisect_left(self._tokens, key)]
+                else:
+                    self._tokens.remove(key)
+
+    def add(self, document: dict):
+        audio_id = document["id"]
+        if audio_id in self._numbers:
+            self.remove(audio_id)
+        number = len(self._ids)
+        if number == len(self._uploaded):
+            self._uploaded = np.concatenate([self._uploaded, np.zeros(number)])
+            self._podcast = np.concatenate([self._podcast, np.zeros(number, bool)])
+        title_tokens = tuple(dict.fromkeys(tokenize(document.get("title"))))
+        artist_tokens = tuple(dict.fromkeys(tokenize(document.get("artist"))))
+        title = " ".join(title_tokens)
+        self._numbers[audio_id] = number
+        self._ids.append(audio_id)
+        self._keys.append((title_tokens, artist_tokens, title))
+        self._uploaded[number] = document["upload_date"].timestamp()
+        self._podcast[number] = bool(document.get("is_podcast", False))
+        for token in title_tokens:
+            self._post(self._title, token, number)
+        for token in artist_tokens:
+            self._post(self._artist, token, number)
+        if title_tokens:
+            self._post(self._first, title_tokens[0], number)
+            self._post(self._exact, title, number)
+
+    def remove(self, audio_id: str):
+        number = self._numbers.pop(audio_id, None)
+        if number is None:
+            return
+        title_tokens, artist_tokens, title = self._keys[number]
+        self._ids[number] = None
+        self._keys[number] = None
+        for token in title_tokens:
+            self._unpost(self._title, token, number)
+        for token in artist_tokens:
+            self._unpost(self._artist, token, number)
+        if title_tokens:
+            self._unpost(self._first, title_tokens[0], number)
+            self._unpost(self._exact, title, number)
+
+    def _prefix_tokens(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._tokens, prefix)
+        end = bisect.bisect_left(self._tokens, prefix + "\U0010ffff", start)
+        return self._tokens[start:end]
+
+    @staticmethod
+    def _mark(scores: np.ndarray, numbers: Optional[set], value: int):
+        if numbers:
+            index = np.fromiter(numbers, np.int64, len(numbers))
+            scores[index] = np.maximum(scores[index], value)
+
+    def search(self, query: str, offset: int, limit: int, is_podcast: Optional[bool] = None) -> Tuple[List[str], int]:
+        """Ids for one page of matches, best first (newest on ties), and the total match count.
+
+        Every query word must prefix-match a title or artist word. Each word
+        scores 4 for an exact title word, 3 for a title prefix, 2 for an
+        exact artist word and 1 for an artist prefix; a title equal to the
+        query adds 10, a title starting with the first word adds 5.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        size = len(self._ids)
+        if not terms or not size:
+            return [], 0
+        total_score = np.zeros(size, np.int32)
+        matched = np.ones(size, bool)
+        for term in terms:
+            scores = np.zeros(size, np.int8)
+            for token in self._prefix_tokens(term):
+                exact = token == term
+                self._mark(scores, self._title.get(token), 4 if exact else 3)
+                self._mark(scores, self._artist.get(token), 2 if exact else 1)
+            matched &= scores > 0
+            total_score += scores
+
+        bonus = np.zeros(size, np.int8)
+        for token in self._prefix_tokens(terms[0]):
+            self._mark(bonus, self._first.get(token), 5)
+        self._mark(bonus, self._exact.get(" ".join(terms)), 10)
+        total_score += bonus
+
+        if is_podcast is not None:
+            matched &= self._podcast[:size] == is_podcast
+        candidates = np.flatnonzero(matched)
+        # Best score first, then newest upload
+        order = np.lexsort((-self._uploaded[candidates], -total_score[candidates]))
+        page = candidates[order[offset:offset + limit]]
+        return [self._ids[number] for number in page], len(candidates)
+
+    def finish_bulk_load(self):
+        self._tokens.sort()
+        self._sorted = True
+
+    async def load(self):
+        # Tokens are appended unsorted while loading and sorted once at the end.
+        # A retry after a failed load keeps what the first attempt indexed.
+        self._sorted = False
+        try:
+            await self._read({})
+        finally:
+            self.finish_bulk_load()
+        self.ready.set()
+
+    async def refresh(self):
+        query = {}
+        if self.last_seen is not None:
+            since = self.last_seen.generation_time - timedelta(seconds=SEARCH_REFRESH_OVERLAP)
+            query = {"_id": {"$gte": ObjectId.from_datetime(since)}}
+        await self._read(query)
+
+    async def _read(self, query: dict):
+        cursor = db.audio_metadata.find(query, SEARCH_FIELDS).batch_size(1000)
+        async for document in cursor:
+            if self.last_seen is None or document["_id"] > self.last_seen:
+                self.last_seen = document["_id"]
+            if document["id"] not in self._numbers:
+                self.add(document)
+
+    async def run(self):
+        while True:
+            try:
+                await self.load()
+                break
+            except Exception as e:
+                logger.warning("Search index load failed, retrying: %s", e)
+                await asyncio.sleep(SEARCH_REFRESH_SECONDS)
+        logger.info("Search index loaded %d tracks", len(self))
+        while True:
+            await asyncio.sleep(SEARCH_REFRESH_SECONDS)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Search index refresh failed: %s", e)
+
+search_index = SearchIndex()
+search_task = None
+
+# Blob storage backends: audio bytes live behind a small interface so they
+# can be kept out of MongoDB. Every blob records which backend holds it, so
+# changing AUDIO_STORAGE_BACKEND never strands existing files.
+STREAM_READ_SIZE = 256 * 1024
+
+class GridFSWriter:
+    def __init__(self, grid_in):
+        self._grid_in = grid_in
+        self.file_id = str(grid_in._id)
+
+    async def write(self, piece: bytes):
+        await self._grid_in.write(piece)
+
+    async def close(self):
+        await self._grid_in.close()
+
+    async def abort(self):
+        await self._grid_in.abort()
+
+class GridFSStorage:
+    name = "gridfs"
+
+    def __init__(self, bucket: AsyncIOMotorGridFSBucket):
+        self.bucket = bucket
+
+    def open_writer(self, filename: str, content_type: str) -> GridFSWriter:
+        return GridFSWriter(self.bucket.open_upload_stream(filename, metadata={"contentType": content_type}))
+
+    async def delete(self, file_id: str):
+        # Already gone is fine: catalogue imports can carry file ids with no bytes here
+        try:
+            await self.bucket.delete(ObjectId(file_id))
+        except NoFile:
+            pass
+
+    def local_path(self, file_id: str) -> Optional[Path]:
+        return None
+
+    async def iter_range(self, file_id: str, start: int, end: int):
+        # seek() jumps straight to the chunk holding `start`; earlier chunks are never read
+        started = time.perf_counter()
+        grid_out = await self.bucket.open_download_stream(ObjectId(file_id))
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.readchunk()
+            STORAGE_READ_SECONDS.observe(time.perf_counter() - started, self.name)
+            if not chunk:
+                break
+            if len(chunk) > remaining:
+                chunk = chunk[:remaining]
+            remaining -= len(chunk)
+            yield chunk
+            started = time.perf_counter()
+
+class LocalDiskWriter:
+    def __init__(self, path: Path):
+        self.file_id = path.name
+        self._path = path
+        self._partial = path.with_suffix(".part")
+        self._handle = None
+
+    def _open(self):
+        self._partial.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = open(self._partial, "wb")
+
+    async def write(self, piece: bytes):
+        if self._handle is None:
+            await asyncio.to_thread(self._open)
+        await asyncio.to_thread(self._handle.write, piece)
+
+    def _finish(self):
+        if self._handle is None:
+            self._open()
+        self._handle.close()
+        # Readers only ever see complete files
+        os.replace(self._partial, self._path)
+
+    async def close(self):
+        await asyncio.to_thread(self._finish)
+
+    def _discard(self):
+        if self._handle is not None:
+            self._handle.close()
+        self._partial.unlink(missing_ok=True)
+
+    async def abort(self):
+        await asyncio.to_thread(self._discard)
+
+class LocalDiskStorage:
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _path(self, file_id: str) -> Path:
+        if not re.fullmatch(r"[0-9a-f]{32}", file_id):
+            raise ValueError(f"Invalid local file id: {file_id}")
+        # Two-level fan-out keeps directories small
+        return self.root / file_id[:2] / file_id
+
+    def open_writer(self, filename: str, content_type: str) -> LocalDiskWriter:
+        return LocalDiskWriter(self._path(uuid.uuid4().hex))
+
+    async def delete(self, file_id: str):
+        await asyncio.to_thread(self._path(file_id).unlink, missing_ok=True)
+
+    def local_path(self, file_id: str) -> Optional[Path]:
+        return self._path(file_id)
+
+    async def iter_range(self, file_id: str, start: int, end: int):
+        handle = await anyio.open_file(self._path(file_id), "rb")
+        try:
+            await handle.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                started = time.perf_counter()
+                chunk = await handle.read(min(STREAM_READ_SIZE, remaining))
+                STORAGE_READ_SECONDS.observe(time.perf_counter() - started, self.name)
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await handle.aclose()
+
+class LocalFileRangeResponse(Response):
+    """Send one byte range of a local file.
+
+    Uses the ASGI zero-copy send extension (sendfile) when the server offers
+    it, and falls back to threadpool reads otherwise.
+    """
+
+    def __init__(self, path: Path, start: int, end: int, status_code: int, headers: dict, media_type: str, on_sent=None):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.on_sent = on_sent  # Called with the body bytes sent, even if the client hung up
+        self.sent = 0
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self._send_range(scope, send)
+        finally:
+            if self.on_sent is not None:
+                self.on_sent(self.sent)
+
+    async def _send_range(self, scope, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        count = self.end - self.start + 1
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            handle = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": handle,
+                    "offset": self.start,
+                    "count": count,
+                    "more_body": False
+                })
+                self.sent = count
+            finally:
+                await anyio.to_thread.run_sync(handle.close)
+            return
+        async with await anyio.open_file(self.path, "rb") as handle:
+            await handle.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await handle.read(min(STREAM_READ_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                self.sent += len(chunk)
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+storage_backends = {
+    "gridfs": GridFSStorage(fs),
+    "local": LocalDiskStorage(Path(os.environ.get('AUDIO_STORAGE_PATH', ROOT_DIR / 'audio_storage')))
+}
+default_storage = storage_backends[os.environ.get('AUDIO_STORAGE_BACKEND', 'gridfs')]
+
+def storage_for(record: dict):
+    # Records written before backends existed have no "storage" key
+    return storage_backends[record.get("storage", "gridfs")]
+
+# Hot-track byte cache: a few popular tunes dominate stream traffic, so their
+# full bodies are kept in memory, evicted LRU by size. Any range of a cached
+# file is answered from its body; ranges never get entries of their own.
+class ByteRangeCache:
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._entries = OrderedDict()  # file_id -> full body
+        self._filling = {}  # file_id -> size, for reads currently buffering a body
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+
+    def cacheable(self, file_size: int) -> bool:
+        return 0 < file_size <= min(self.max_item_bytes, self.max_bytes)
+
+    def get(self, file_id: str, start: int, end: int) -> Optional[memoryview]:
+        data = self._entries.get(file_id)
+        if data is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(file_id)
+        self.hits += 1
+        self.bytes_served += end - start + 1
+        return memoryview(data)[start:end + 1]
+
+    def begin_fill(self, file_id: str, file_size: int) -> bool:
+        # One reader per file buffers its body, and all buffers together stay
+        # within max_bytes, so memory doesn't grow with concurrent listeners
+        if (file_id in self._filling or not self.cacheable(file_size)
+                or sum(self._filling.values()) + file_size > self.max_bytes):
+            return False
+        self._filling[file_id] = file_size
+        return True
+
+    def end_fill(self, file_id: str, data: Optional[bytes]):
+        # data is None when the read was abandoned part-way
+        file_size = self._filling.pop(file_id, None)
+        if data is None or file_size != len(data) or file_id in self._entries:
+            return
+        self._entries[file_id] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, file_id: str):
+        self.size -= len(self._entries.pop(file_id))
+
+    def invalidate(self, file_id: str):
+        if file_id in self._entries:
+            self._remove(file_id)
+        # A fill still in progress must not re-add the old bytes
+        self._filling.pop(file_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "max_item_bytes": self.max_item_bytes,
+            "filling": len(self._filling),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_served": self.bytes_served
+        }
+
+byte_cache = ByteRangeCache(
+    max_bytes=int(float(os.environ.get('AUDIO_BYTE_CACHE_MB', 128)) * 1024 * 1024),
+    max_item_bytes=int(float(os.environ.get('AUDIO_BYTE_CACHE_MAX_ITEM_MB', 16)) * 1024 * 1024)
+)
+
+async def read_range(storage, file_id: str, start: int, end: int, file_size: int):
+    """Yield bytes start..end, from the byte cache when possible.
+
+    Only a complete read of the whole file populates the cache; partial
+    ranges and abandoned reads (client went away) stream straight through.
+    """
+    cached = byte_cache.get(file_id, start, end) if byte_cache.max_bytes else None
+    if cached is not None:
+        for offset in range(0, len(cached), STREAM_READ_SIZE):
+            yield bytes(cached[offset:offset + STREAM_READ_SIZE])
+        return
+    full_body = start == 0 and end == file_size - 1
+    if not byte_cache.max_bytes or not full_body or not byte_cache.begin_fill(file_id, file_size):
+        async for chunk in storage.iter_range(file_id, start, end):
+            yield chunk
+        return
+    buffer = bytearray()
+    try:
+        async for chunk in storage.iter_range(file_id, start, end):
+            buffer.extend(chunk)
+            yield chunk
+    except BaseException:
+        byte_cache.end_fill(file_id, None)
+        raise
+    byte_cache.end_fill(file_id, bytes(buffer))
+
+# Basic routes
+@api_router.get("/")
+async def root():
+    return {"message": "Skiza Audio Player API"}
+
+HEALTH_PING_TIMEOUT = float(os.environ.get('HEALTH_PING_TIMEOUT', 2))
+
+@api_router.get("/health")
+async def health_check():
+    """Readiness: Mongo must answer a ping; pool usage is reported alongside."""
+    started = time.perf_counter()
+    mongo = {"ok": True}
+    try:
+        await asyncio.wait_for(db.command("ping"), HEALTH_PING_TIMEOUT)
+        mongo["ping_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    except Exception as e:
+        mongo = {"ok": False, "error": str(e) or type(e).__name__}
+
+    max_size = client.options.pool_options.max_pool_size
+    in_use = MONGO_POOL_CONNECTIONS.value("in_use")
+    pool = {
+        "max_size": max_size,
+        "open": MONGO_POOL_CONNECTIONS.value("open"),
+        "in_use": in_use,
+        "waiting": MONGO_POOL_CONNECTIONS.value("waiting"),
+        "saturation": round(in_use / max_size, 4) if max_size else 0.0
+    }
+    ready = mongo["ok"]
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "healthy" if ready else "unavailable",
+            "service": "skiza-audio-player",
+            "mongo": mongo,
+            "pool": pool,
+            "jobs_queued": job_queue.queued()
+        }
+    )
+
+@api_router.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@api_router.get("/diagnostics/indexes")
+async def index_diagnostics():
+    try:
+        collections = {}
+        missing = []
+        for collection_name, models in INDEX_SPECS.items():
+            existing = await db[collection_name].index_information()
+            indexes = []
+            for model in models:
+                name = model.document["name"]
+                present = name in existing
+                if not present:
+                    missing.append(f"{collection_name}.{name}")
+                indexes.append({
+                    "name": name,
+                    "keys": list(model.document["key"].items()),
+                    "unique": model.document.get("unique", False),
+                    "present": present,
+                    **index_build_status.get(f"{collection_name}.{name}", {"status": "pending"})
+                })
+            collections[collection_name] = indexes
+        return {"healthy": not missing, "missing": missing, "collections": collections}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to inspect indexes: {str(e)}")
+
+@api_router.get("/diagnostics/cache")
+async def cache_diagnostics():
+    return {"metadata": metadata_cache.stats(), "audio_bytes": byte_cache.stats()}
+
+# Audio probing: container headers are parsed as the upload streams past.
+# Only a small head window (and, for formats that keep timing data at the
+# end, a rolling tail window) is retained, never the whole file.
+PROBE_HEAD_SIZE = 64 * 1024
+PROBE_TAIL_SIZES = {"ogg": 64 * 1024, "mp4": 1024 * 1024}
+
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+def detect_container(head: bytes) -> Optional[str]:
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    # Layer bits 00 are reserved in MPEG audio but mark ADTS AAC (FF F1 / FF F9)
+    if head[:3] == b"ID3" or (head[0] == 0xFF and head[1] & 0xE0 == 0xE0 and head[1] & 0x06):
+        return "mp3"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:4] == b"fLaC":
+        return "flac"
+    return None
+
+def id3v2_size(head: bytes) -> int:
+    # Syncsafe size excludes the 10-byte header (and the optional footer)
+    if head[:3] != b"ID3" or len(head) < 10:
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+def parse_mp3_frame_header(header: bytes) -> Optional[dict]:
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = {0: 2.5, 2: 2, 3: 1}.get((header[1] >> 3) & 0x03)
+    layer = {1: 3, 2: 2, 3: 1}.get((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if layer == 2 or version == 1 else 576
+        frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": 1 if header[3] >> 6 == 3 else 2,
+        "samples_per_frame": samples_per_frame,
+        "frame_length": frame_length
+    }
+
+def probe_wav(head: bytes, total_size: int) -> "AudioProbeResult":
+    result = AudioProbeResult(container="wav", mime_type="audio/wav")
+    pos = 12
+    byte_rate = None
+    while pos + 8 <= len(head):
+        chunk_id = head[pos:pos + 4]
+        chunk_size = struct.unpack_from("<I", head, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt " and body + 16 <= len(head):
+            audio_format, channels, sample_rate, byte_rate, block_align, bits = struct.unpack_from("<HHIIHH", head, body)
+            result.channels = channels
+            result.sample_rate = sample_rate
+            result.bits_per_sample = bits
+            result.bitrate = byte_rate * 8
+            if audio_format in (1, 0xFFFE):
+                result.codec = "pcm_u8" if bits == 8 else f"pcm_s{bits}le"
+            elif audio_format == 3:
+                result.codec = f"pcm_f{bits}le"
+            else:
+                result.codec = f"wav_0x{audio_format:04x}"
+        elif chunk_id == b"data":
+            # Streamed WAVs often leave the size as 0 or 0xFFFFFFFF
+            data_size = chunk_size
+            if data_size in (0, 0xFFFFFFFF) or body + data_size > total_size:
+                data_size = total_size - body
+            result.data_offset = body
+            result.data_size = data_size
+            if byte_rate:
+                result.duration = data_size / byte_rate
+            break
+        pos = body + chunk_size + (chunk_size & 1)
+    return result
+
+def probe_mp3(window: bytes, audio_offset: int, total_size: int) -> "AudioProbeResult":
+    # Nothing is claimed until a frame header parses; an ID3 tag or a sync
+    # word alone doesn't make the file MPEG audio
+    frame = None
+    index = 0
+    while index + 4 <= len(window):
+        index = window.find(b"\xff", index)
+        if index == -1 or index + 4 > len(window):
+            return AudioProbeResult()
+        frame = parse_mp3_frame_header(window[index:index + 4])
+        if frame:
+            # Require the following frame to line up, to skip false syncs
+            following = index + frame["frame_length"]
+            if following + 4 > len(window) or parse_mp3_frame_header(window[following:following + 4]):
+                break
+        frame = None
+        index += 1
+    if frame is None:
+        return AudioProbeResult()
+
+    result = AudioProbeResult(
+        container="mp3",
+        codec=f"mp{frame['layer']}",
+        mime_type="audio/mpeg",
+        sample_rate=frame["sample_rate"],
+        channels=frame["channels"]
+    )
+    audio_bytes = total_size - audio_offset - index
+
+    # VBR files carry a Xing/Info or VBRI header in the first frame
+    side_info = (17 if frame["channels"] == 1 else 32) if frame["version"] == 1 else (9 if frame["channels"] == 1 else 17)
+    xing = index + 4 + side_info
+    vbri = index + 4 + 32
+    frames = None
+    vbr_bytes = None
+    if window[xing:xing + 4] in (b"Xing", b"Info") and xing + 8 <= len(window):
+        flags = struct.unpack_from(">I", window, xing + 4)[0]
+        pos = xing + 8
+        if flags & 0x01 and pos + 4 <= len(window):
+            frames = struct.unpack_from(">I", window, pos)[0]
+            pos += 4
+        if flags & 0x02 and pos + 4 <= len(window):
+            vbr_bytes = struct.unpack_from(">I", window, pos)[0]
+    elif window[vbri:vbri + 4] == b"VBRI" and vbri + 18 <= len(window):
+        vbr_bytes, frames = struct.unpack_from(">II", window, vbri + 10)
+
+    if frames:
+        result.duration = frames * frame["samples_per_frame"] / frame["sample_rate"]
+        result.bitrate = int((vbr_bytes or audio_bytes) * 8 / result.duration) if result.duration else None
+    else:
+        result.bitrate = frame["bitrate"]
+        result.duration = audio_bytes * 8 / frame["bitrate"]
+    return result
+
+def probe_ogg(head: bytes, tail: bytes, total_size: int) -> "AudioProbeResult":
+    result = AudioProbeResult(container="ogg", mime_type="audio/ogg")
+    if len(head) < 27:
+        return result
+    segments = head[26]
+    packet = head[27 + segments:]
+    pre_skip = 0
+    if packet.startswith(b"\x01vorbis") and len(packet) >= 24:
+        result.codec = "vorbis"
+        result.channels = packet[11]
+        result.sample_rate = struct.unpack_from("<I", packet, 12)[0]
+        granule_rate = result.sample_rate
+        nominal_bitrate = struct.unpack_from("<i", packet, 20)[0]
+        result.bitrate = nominal_bitrate if nominal_bitrate > 0 else None
+    elif packet.startswith(b"OpusHead") and len(packet) >= 16:
+        result.codec = "opus"
+        result.channels = packet[9]
+        pre_skip = struct.unpack_from("<H", packet, 10)[0]
+        result.sample_rate = struct.unpack_from("<I", packet, 12)[0] or 48000
+        granule_rate = 48000  # Opus granules always count 48 kHz samples
+    else:
+        return result
+
+    # The last page's granule position is the total sample count
+    index = tail.rfind(b"OggS")
+    while index != -1:
+        if index + 14 <= len(tail):
+            granule = struct.unpack_from("<q", tail, index + 6)[0]
+            if granule >= 0:
+                result.duration = max(granule - pre_skip, 0) / granule_rate
+                if result.duration:
+                    result.bitrate = int(total_size * 8 / result.duration)
+                break
+        index = tail.rfind(b"OggS", 0, index)
+    return result
+
+def probe_mp4(head: bytes, tail: bytes, total_size: int) -> "AudioProbeResult":
+    result = AudioProbeResult(container="mp4", mime_type="audio/mp4")
+    # moov sits at the start for "fast start" files and at the end otherwise
+    for buffer in (head, tail):
+        index = buffer.find(b"mvhd")
+        while index != -1:
+            if index >= 4 and index + 32 <= len(buffer):
+                box_size = struct.unpack_from(">I", buffer, index - 4)[0]
+                version = buffer[index + 4]
+                if version == 0 and box_size == 108:
+                    timescale, duration = struct.unpack_from(">II", buffer, index + 16)
+                    break
+                if version == 1 and box_size == 120:
+                    timescale, duration = struct.unpack_from(">IQ", buffer, index + 24)
+                    break
+            index = buffer.find(b"mvhd", index + 1)
+        else:
+            continue
+        if timescale:
+            result.duration = duration / timescale
+            if result.duration:
+                result.bitrate = int(total_size * 8 / result.duration)
+        # The sample entry follows mvhd, possibly past the end of the head window
+        for search, start in ((buffer, index), (tail, 0)):
+            for codec, box in (("aac", b"mp4a"), ("alac", b"alac")):
+                entry = search.find(box, start)
+                if entry != -1 and entry + 32 <= len(search):
+                    channels = struct.unpack_from(">H", search, entry + 20)[0]
+                    if 1 <= channels <= 8:
+                        result.codec = codec
+                        result.channels = channels
+                        result.sample_rate = struct.unpack_from(">I", search, entry + 28)[0] >> 16
+                        return result
+        break
+    return result
+
+def probe_flac(head: bytes, total_size: int) -> "AudioProbeResult":
+    result = AudioProbeResult(container="flac", codec="flac", mime_type="audio/flac")
+    # STREAMINFO is always the first metadata block
+    if len(head) < 26 or head[4] & 0x7F != 0:
+        return result
+    info = int.from_bytes(head[18:26], "big")
+    result.sample_rate = info >> 44
+    result.channels = ((info >> 41) & 0x07) + 1
+    result.bits_per_sample = ((info >> 36) & 0x1F) + 1
+    total_samples = info & ((1 << 36) - 1)
+    if result.sample_rate and total_samples:
+        result.duration = total_samples / result.sample_rate
+        result.bitrate = int(total_size * 8 / result.duration)
+    return result
+
+class AudioProbe:
+    """Incremental container probe fed with each upload piece in order."""
+
+    def __init__(self):
+        self.size = 0
+        self.container = None
+        self._head = bytearray()
+        self._tail = bytearray()
+        # MP3 frames start after any ID3v2 tag, which may exceed the head window
+        self._frame_offset = None
+        self._frame_window = bytearray()
+        self._frame_window_end = 0
+
+    def feed(self, piece: bytes):
+        start = self.size
+        self.size += len(piece)
+        if len(self._head) < PROBE_HEAD_SIZE:
+            self._head.extend(piece[:PROBE_HEAD_SIZE - len(self._head)])
+            if self.container is None and len(self._head) >= 12:
+                self.container = detect_container(bytes(self._head[:12]))
+                if self.container == "mp3":
+                    self._frame_offset = id3v2_size(bytes(self._head[:10]))
+                    self._frame_window_end = self._frame_offset
+                    self._capture_frames(self._head[:start], 0)
+
+        if self._frame_offset is not None:
+            self._capture_frames(piece, start)
+
+        tail_size = PROBE_TAIL_SIZES.get(self.container, 0)
+        if tail_size:
+            self._tail.extend(piece[-tail_size:])
+            if len(self._tail) > tail_size:
+                del self._tail[:len(self._tail) - tail_size]
+
+    def _capture_frames(self, piece, start: int):
+        low = max(self._frame_window_end, start)
+        high = min(start + len(piece), self._frame_offset + PROBE_HEAD_SIZE)
+        if low < high:
+            self._frame_window.extend(piece[low - start:high - start])
+            self._frame_window_end = high
+
+    def result(self) -> "AudioProbeResult":
+        head = bytes(self._head)
+        tail = bytes(self._tail)
+        try:
+            if self.container == "wav":
+                return probe_wav(head, self.size)
+            if self.container == "mp3":
+                return probe_mp3(bytes(self._frame_window), self._frame_offset, self.size)
+            if self.container == "ogg":
+                return probe_ogg(head, tail, self.size)
+            if self.container == "mp4":
+                return probe_mp4(head, tail, self.size)
+            if self.container == "flac":
+                return probe_flac(head, self.size)
+        except (struct.error, IndexError, ZeroDivisionError, ValueError) as e:
+            # A malformed header must never fail the upload itself
+            logger.warning("Audio probe failed for %s container: %s", self.container, e)
+        return AudioProbeResult(container=self.container)
+
+# Waveform peaks: min/max envelopes at several zoom levels, computed once per
+# blob so players can draw a scrubbable waveform without fetching any audio.
+# Only PCM WAV can be decoded here; other codecs simply have no peaks.
+PEAK_LEVELS = [512, 2048, 8192, 32768]  # Samples per peak, finest first
+PCM_CODECS = {"pcm_u8", "pcm_s16le", "pcm_s24le", "pcm_s32le", "pcm_f32le", "pcm_f64le"}
+
+def decode_pcm(data: bytes, codec: str) -> np.ndarray:
+    """Decode little-endian PCM bytes to float32 samples in [-1, 1]."""
+    if codec == "pcm_u8":
+        return (np.frombuffer(data, np.uint8).astype(np.float32) - 128) / 128
+    if codec == "pcm_s16le":
+        return np.frombuffer(data, "<i2").astype(np.float32) / 32768
+    if codec == "pcm_s24le":
+        raw = np.frombuffer(data, np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = np.where(samples & 0x800000, samples - 0x1000000, samples)
+        return samples.astype(np.float32) / 8388608
+    if codec == "pcm_s32le":
+        return (np.frombuffer(data, "<i4") / 2147483648).astype(np.float32)
+    if codec == "pcm_f32le":
+        return np.frombuffer(data, "<f4").astype(np.float32)
+    if codec == "pcm_f64le":
+        return np.frombuffer(data, "<f8").astype(np.float32)
+    raise ValueError(f"Unsupported PCM codec: {codec}")
+
+def reduce_pcm_chunk(frames: bytes, codec: str, channels: int, carry_min: np.ndarray, carry_max: np.ndarray) -> tuple:
+    """Reduce whole PCM frames to finest-level bins.
+
+    Frames left over from the previous chunk come in as carry and frames
+    that don't fill a bin go back out as carry. Pure, so it can run in the
+    process pool.
+    """
+    samples = decode_pcm(frames, codec).reshape(-1, channels)
+    # Mix channels by envelope: a bin's peak is the extreme of any channel
+    frame_min = np.concatenate((carry_min, samples.min(axis=1)))
+    frame_max = np.concatenate((carry_max, samples.max(axis=1)))
+    base = PEAK_LEVELS[0]
+    whole = len(frame_min) // base * base
+    return (
+        frame_min[:whole].reshape(-1, base).min(axis=1),
+        frame_max[:whole].reshape(-1, base).max(axis=1),
+        frame_min[whole:],
+        frame_max[whole:]
+    )
+
+class PeaksBuilder:
+    """Accumulates per-bin min/max of the finest level as PCM streams past."""
+
+    def __init__(self, codec: str, bits_per_sample: int, channels: int):
+        self.codec = codec
+        self.channels = channels
+        self.frame_bytes = bits_per_sample // 8 * channels
+        self._pending = b""  # Trailing bytes of an incomplete frame
+        self._carry_min = np.empty(0, np.float32)  # Frames not yet filling a bin
+        self._carry_max = np.empty(0, np.float32)
+        self._mins = []
+        self._maxs = []
+
+    def take_frames(self, data: bytes) -> bytes:
+        # Returns whole frames only; a split frame waits for the next chunk
+        data = self._pending + data
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        return data[:usable]
+
+    def reduce_args(self, frames: bytes) -> tuple:
+        return (frames, self.codec, self.channels, self._carry_min, self._carry_max)
+
+    def add_reduced(self, bin_min: np.ndarray, bin_max: np.ndarray, carry_min: np.ndarray, carry_max: np.ndarray):
+        if len(bin_min):
+            self._mins.append(bin_min)
+            self._maxs.append(bin_max)
+        self._carry_min = carry_min
+        self._carry_max = carry_max
+
+    def finish(self) -> List[dict]:
+        mins = self._mins + ([self._carry_min.min(keepdims=True)] if len(self._carry_min) else [])
+        maxs = self._maxs + ([self._carry_max.max(keepdims=True)] if len(self._carry_max) else [])
+        if not mins:
+            return []
+        finest_min = np.concatenate(mins)
+        finest_max = np.concatenate(maxs)
+
+        levels = []
+        for samples_per_peak in PEAK_LEVELS:
+            factor = samples_per_peak // PEAK_LEVELS[0]
+            # Pad with neutral values so the last partial bin still reduces
+            pad = -len(finest_min) % factor
+            level_min = np.pad(finest_min, (0, pad), constant_values=1.0).reshape(-1, factor).min(axis=1)
+            level_max = np.pad(finest_max, (0, pad), constant_values=-1.0).reshape(-1, factor).max(axis=1)
+            # Interleaved int8 (min, max) pairs: two bytes per peak
+            pairs = np.column_stack((level_min, level_max))
+            quantized = np.clip(np.round(pairs * 127), -127, 127).astype(np.int8)
+            levels.append({
+                "samples_per_peak": samples_per_peak,
+                "length": len(level_min),
+                "data": Binary(quantized.tobytes())
+            })
+        return levels
+
+async def generate_peaks(blob: StoredBlob):
+    """Compute and store peaks for a PCM WAV blob, once per content hash."""
+    probe = blob.probe
+    if probe.codec not in PCM_CODECS or probe.data_offset is None or not probe.channels or not probe.bits_per_sample:
+        return
+    if await db.audio_peaks.find_one({"content_hash": blob.content_hash}, {"_id": 1}):
+        return
+    builder = PeaksBuilder(probe.codec, probe.bits_per_sample, probe.channels)
+    storage = storage_backends[blob.storage]
+    end = min(probe.data_offset + (probe.data_size or blob.file_size), blob.file_size) - 1
+    if end >= probe.data_offset:
+        async for chunk in storage.iter_range(blob.file_id, probe.data_offset, end):
+            frames = builder.take_frames(chunk)
+            if frames:
+                builder.add_reduced(*await run_cpu_bound(reduce_pcm_chunk, *builder.reduce_args(frames)))
+    levels = builder.finish()
+    if not levels:
+        return
+    await db.audio_peaks.update_one(
+        {"content_hash": blob.content_hash},
+        {"$setOnInsert": {
+            "content_hash": blob.content_hash,
+            "sample_rate": probe.sample_rate,
+            "channels": probe.channels,
+            "levels": levels,
+            "created_date": datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+# HLS segments: MP3 audio is cut at frame boundaries into fixed-duration
+# segments plus an .m3u8 playlist, once per blob, so players can start from
+# any point and only fetch what they play. Segments are packed audio (raw
+# frames behind an ID3 timestamp tag), which needs no re-encoding; other
+# codecs have no segmented mode.
+HLS_CODECS = {"mp3"}
+HLS_SEGMENT_SECONDS = float(os.environ.get('HLS_SEGMENT_SECONDS', 6))
+HLS_AT_INGEST = os.environ.get('HLS_AT_INGEST', 'true').lower() == 'true'  # Otherwise built on first request
+HLS_TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+
+def syncsafe(value: int) -> bytes:
+    return bytes(((value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F))
+
+def hls_timestamp_tag(seconds: float) -> bytes:
+    # ID3v2.4 PRIV frame carrying the segment's start as a 33-bit 90 kHz timestamp
+    data = HLS_TIMESTAMP_OWNER + struct.pack(">Q", round(seconds * 90000) & (2 ** 33 - 1))
+    frame = b"PRIV" + syncsafe(len(data)) + b"\x00\x00" + data
+    return b"ID3\x04\x00\x00" + syncsafe(len(frame)) + frame
+
+def is_vbr_info_frame(data: bytes, offset: int, frame: dict) -> bool:
+    # Xing/Info/VBRI frames hold seek metadata, not audio
+    side_info = (17 if frame["channels"] == 1 else 32) if frame["version"] == 1 else (9 if frame["channels"] == 1 else 17)
+    xing = offset + 4 + side_info
+    vbri = offset + 4 + 32
+    return data[xing:xing + 4] in (b"Xing", b"Info") or data[vbri:vbri + 4] == b"VBRI"
+
+def scan_mp3_frames(data: bytes) -> Tuple[List[Tuple[int, dict]], int]:
+    """Find whole MP3 frames in data.
+
+    Returns (offset, header) pairs and how many bytes were consumed; an
+    incomplete trailing frame is left for the next call. Bytes that are not
+    a valid frame header are skipped up to the next sync byte.
+    """
+    frames = []
+    index = 0
+    while index + 4 <= len(data):
+        frame = parse_mp3_frame_header(data[index:index + 4])
+        if frame is None or frame["frame_length"] < 4:
+            index = data.find(b"\xff", index + 1)
+            if index == -1:
+                return frames, len(data)
+            continue
+        if index + frame["frame_length"] > len(data):
+            break
+        frames.append((index, frame))
+        index += frame["frame_length"]
+    return frames, index
+
+class HlsSegmenter:
+    """Groups MP3 frames into segments of at least segment_seconds as bytes stream past."""
+
+    def __init__(self, segment_seconds: float):
+        self.segment_seconds = segment_seconds
+        self._pending = b""
+        self._skip = None  # Leading ID3v2 tag bytes still to drop
+        self._first_frame = True
+        self._frames = bytearray()
+        self._samples = 0
+        self._sample_rate = None
+        self._start = 0.0  # Seconds at the start of the current segment
+
+    def take(self, data: bytes) -> bytes:
+        data = self._pending + data
+        if self._skip is None:
+            if len(data) < 10:
+                self._pending = data
+                return b""
+            self._skip = id3v2_size(data[:10])
+        if self._skip:
+            dropped = min(self._skip, len(data))
+            self._skip -= dropped
+            data = data[dropped:]
+        self._pending = b""
+        return data
+
+    def add(self, data: bytes) -> List[Tuple[float, float, bytes]]:
+        """Feed bytes returned by take(); returns completed (start, duration, body) segments."""
+        frames, consumed = scan_mp3_frames(data)
+        self._pending = data[consumed:]
+        segments = []
+        for offset, frame in frames:
+            if self._first_frame:
+                self._first_frame = False
+                if is_vbr_info_frame(data, offset, frame):
+                    continue
+            self._frames += data[offset:offset + frame["frame_length"]]
+            self._samples += frame["samples_per_frame"]
+            self._sample_rate = frame["sample_rate"]
+            if self._samples >= self.segment_seconds * self._sample_rate:
+                segments.append(self._cut())
+        return segments
+
+    def _cut(self) -> Tuple[float, float, bytes]:
+        duration = self._samples / self._sample_rate
+        segment = (self._start, duration, hls_timestamp_tag(self._start) + bytes(self._frames))
+        self._start += duration
+        self._frames = bytearray()
+        self._samples = 0
+        return segment
+
+    def finish(self) -> List[Tuple[float, float, bytes]]:
+        return [self._cut()] if self._samples else []
+
+async def delete_hls_segments(segments: List[dict]):
+    for segment in segments:
+        await storage_for(segment).delete(segment["file_id"])
+        byte_cache.invalidate(segment["file_id"])
+
+async def generate_hls(blob: StoredBlob):
+    """Cut and store HLS segments for an MP3 blob, once per content hash."""
+    if blob.probe.codec not in HLS_CODECS:
+        return
+    if await db.audio_hls.find_one({"content_hash": blob.content_hash}, {"_id": 1}):
+        return
+    segmenter = HlsSegmenter(HLS_SEGMENT_SECONDS)
+    segments = []
+
+    async def store(start: float, duration: float, body: bytes):
+        writer = default_storage.open_writer(f"{blob.content_hash}-{len(segments)}.mp3", "audio/mpeg")
+        try:
+            await writer.write(body)
+            await writer.close()
+        except BaseException:
+            await writer.abort()
+            raise
+        segments.append({
+            "index": len(segments),
+            "start": round(start, 6),
+            "duration": round(duration, 6),
+            "storage": default_storage.name,
+            "file_id": writer.file_id,
+            "size": len(body)
+        })
+
+    try:
+        storage = storage_backends[blob.storage]
+        async for chunk in storage.iter_range(blob.file_id, 0, blob.file_size - 1):
+            data = segmenter.take(chunk)
+            for segment in segmenter.add(data) if data else []:
+                await store(*segment)
+        for segment in segmenter.finish():
+            await store(*segment)
+        if not segments:
+            return
+        result = await db.audio_hls.update_one(
+            {"content_hash": blob.content_hash},
+            {"$setOnInsert": {
+                "content_hash": blob.content_hash,
+                "segment_seconds": HLS_SEGMENT_SECONDS,
+                "target_duration": math.ceil(max(segment["duration"] for segment in segments)),
+                "segments": segments,
+                "created_date": datetime.utcnow()
+            }},
+            upsert=True
+        )
+    except BaseException:
+        await delete_hls_segments(segments)
+        raise
+    if result.upserted_id is None:
+        # A concurrent build finished first
+        await delete_hls_segments(segments)
+
+async def delete_hls(content_hash: str):
+    hls = await db.audio_hls.find_one_and_delete({"content_hash": content_hash})
+    if hls:
+        await delete_hls_segments(hls["segments"])
+
+# Lazy builds in progress, keyed by content hash, shared by concurrent requests
+hls_builds = {}
+
+async def ensure_hls(audio_meta: dict) -> Optional[dict]:
+    content_hash = audio_meta.get("content_hash")
+    if not content_hash or audio_meta.get("codec") not in HLS_CODECS:
+        return None
+    projection = {"_id": 0, "segments.index": 0, "segments.storage": 0, "segments.file_id": 0}
+    hls = await db.audio_hls.find_one({"content_hash": content_hash}, projection)
+    if hls is not None:
+        return hls
+    build = hls_builds.get(content_hash)
+    if build is None:
+        blob = StoredBlob(
+            storage=audio_meta.get("storage", "gridfs"),
+            file_id=audio_meta["file_id"],
+            file_size=audio_meta["file_size"],
+            content_hash=content_hash,
+            probe=AudioProbeResult(codec=audio_meta["codec"])
+        )
+        build = asyncio.ensure_future(generate_hls(blob))
+        hls_builds[content_hash] = build
+        build.add_done_callback(lambda _: hls_builds.pop(content_hash, None))
+    # A client hanging up must not cancel the build other listeners wait on
+    await asyncio.shield(build)
+    return await db.audio_hls.find_one({"content_hash": content_hash}, projection)
+
+# Background jobs: an in-process asyncio worker pool backed by the jobs
+# collection. Jobs survive restarts (queued and interrupted jobs are picked
+# up again on startup) and failed jobs are retried with backoff. A running
+# job is leased to the process executing it; other processes only take it
+# over once the lease has expired, so several workers can share the queue.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_PROCESSES = int(os.environ.get('JOB_PROCESSES', 1))
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 5  # Seconds, doubled on each further attempt
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+JOB_HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 3
+JOB_OWNER = str(uuid.uuid4())  # This process, as recorded on the jobs it runs
+
+# Process pool for CPU-bound stages, created on startup
+process_pool = None
+
+async def run_cpu_bound(fn, *args):
+    if process_pool is None:
+        return await asyncio.to_thread(fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(process_pool, fn, *args)
+
+async def run_peaks_job(job: dict):
+    await generate_peaks(StoredBlob(**job["payload"]))
+
+async def run_hls_job(job: dict):
+    await generate_hls(StoredBlob(**job["payload"]))
+
+JOB_HANDLERS = {
+    "peaks": run_peaks_job,
+    "hls": run_hls_job,
+}
+
+def ingest_jobs_for(blob: StoredBlob) -> List[str]:
+    jobs = []
+    if blob.probe.codec in PCM_CODECS:
+        jobs.append("peaks")
+    if HLS_AT_INGEST and blob.probe.codec in HLS_CODECS:
+        jobs.append("hls")
+    return jobs
+
+async def update_processing_status(audio_id: str):
+    # The audio is done once none of its jobs are outstanding
+    outstanding = await db.jobs.count_documents({"audio_id": audio_id, "status": {"$in": ["queued", "running"]}})
+    if outstanding:
+        return
+    failed = await db.jobs.count_documents({"audio_id": audio_id, "status": "failed"})
+    await db.audio_metadata.update_one(
+        {"id": audio_id},
+        {"$set": {"processing": "failed" if failed else "done"}}
+    )
+    metadata_cache.invalidate(audio_id)
+
+class JobQueue:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._queue = None
+        self._tasks = set()
+        self._running = set()  # Ids of jobs this process holds leases on
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        await self._reclaim_expired()
+        async for job in db.jobs.find({"status": "queued"}, {"id": 1}).sort("created_date", 1):
+            self._queue.put_nowait(job["id"])
+        for _ in range(self.workers):
+            self._spawn(self._worker())
+        self._spawn(self._heartbeat())
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Hand interrupted jobs back right away rather than when the lease runs out
+        await db.jobs.update_many(
+            {"status": "running", "owner": JOB_OWNER},
+            {"$set": {"status": "queued", "owner": None, "lease_expires": None}}
+        )
+
+    async def _reclaim_expired(self) -> int:
+        # A "running" job whose lease lapsed lost its process (crash, kill -9);
+        # jobs written before leases existed have none and are reclaimed too
+        expired = {"status": "running", "lease_expires": {"$not": {"$gte": datetime.utcnow()}}}
+        job_ids = [job["id"] async for job in db.jobs.find(expired, {"id": 1})]
+        reclaimed = 0
+        for job_id in job_ids:
+            result = await db.jobs.update_one(
+                {"id": job_id, **expired},
+                {"$set": {"status": "queued", "owner": None, "lease_expires": None}}
+            )
+            if result.modified_count:
+                reclaimed += 1
+                if self._queue is not None:
+                    self._queue.put_nowait(job_id)
+        if reclaimed:
+            logger.warning("Reclaimed %d jobs with expired leases", reclaimed)
+        return reclaimed
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                if self._running:
+                    await db.jobs.update_many(
+                        {"id": {"$in": list(self._running)}, "owner": JOB_OWNER},
+                        {"$set": {"lease_expires": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}}
+                    )
+                await self._reclaim_expired()
+            except Exception as e:
+                logger.warning("Job heartbeat failed: %s", e)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def enqueue(self, audio_id: str, job_type: str, payload: dict) -> Job:
+        job = Job(audio_id=audio_id, type=job_type, payload=payload, max_attempts=JOB_MAX_ATTEMPTS)
+        await db.jobs.insert_one(job.dict())
+        if self._queue is not None:
+            self._queue.put_nowait(job.id)
+        return job
+
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _retry_later(self, job_id: str, delay: float):
+        await asyncio.sleep(delay)
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        now = datetime.utcnow()
+        job = await db.jobs.find_one_and_update(
+            {"id": job_id, "status": "queued"},
+            {
+                "$set": {
+                    "status": "running",
+                    "owner": JOB_OWNER,
+                    "lease_expires": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                    "updated_date": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            return  # Claimed by another worker, finished, or deleted
+
+        update = {"status": "done", "error": None}
+        self._running.add(job_id)
+        try:
+            # The audio may have been deleted while the job was queued
+            if await db.audio_metadata.find_one({"id": job["audio_id"]}, {"_id": 1}):
+                await JOB_HANDLERS[job["type"]](job)
+        except Exception as e:
+            logger.warning("Job %s (%s) attempt %d failed: %s", job_id, job["type"], job["attempts"], e)
+            update = {"status": "failed", "error": str(e)}
+            if job["attempts"] < job["max_attempts"]:
+                update["status"] = "queued"
+        finally:
+            self._running.discard(job_id)
+
+        update.update(owner=None, lease_expires=None, updated_date=datetime.utcnow())
+        result = await db.jobs.update_one({"id": job_id, "owner": JOB_OWNER}, {"$set": update})
+        if not result.matched_count:
+            # Deleted with its audio, or the lease lapsed and another process took it over
+            logger.info("Job %s was reclaimed or deleted while running", job_id)
+            return
+        if update["status"] == "queued":
+            self._spawn(self._retry_later(job_id, JOB_RETRY_DELAY * 2 ** (job["attempts"] - 1)))
+        else:
+            await update_processing_status(job["audio_id"])
+
+job_queue = JobQueue(JOB_WORKERS)
+
+# Play tracking: stream responses add to in-memory per-track counters that
+# are flushed periodically as unordered bulk $inc upserts into play_stats,
+# so the streaming path never waits on a write. A play is a response that
+# starts at the first byte (or the first HLS segment); listening time is
+# estimated from the bytes actually delivered.
+PLAY_FLUSH_SECONDS = float(os.environ.get('PLAY_FLUSH_SECONDS', 10))
+PLAY_FLUSH_MAX_TRACKS = 5000  # Flush early once this many tracks are buffered
+PLAY_PROBE_BYTES = 64 * 1024  # Shorter reads from byte 0 (e.g. Safari's bytes=0-1) aren't plays
+
+async def metered(chunks, on_sent):
+    # Counts what the server actually pulled from the body, even on disconnect
+    sent = 0
+    try:
+        async for chunk in chunks:
+            yield chunk
+            sent += len(chunk)
+    finally:
+        on_sent(sent)
+
+class PlayTracker:
+    def __init__(self):
+        self._pending = {}  # audio_id -> [plays, seconds, bytes]
+        self._task = None
+        self._early_flush = None
+
+    def record(self, audio_id: str, plays: int = 0, seconds: float = 0.0, bytes_sent: int = 0):
+        counters = self._pending.get(audio_id)
+        if counters is None:
+            counters = self._pending[audio_id] = [0, 0.0, 0]
+        counters[0] += plays
+        counters[1] += seconds
+        counters[2] += bytes_sent
+        if len(self._pending) >= PLAY_FLUSH_MAX_TRACKS and self._task is not None:
+            if self._early_flush is None or self._early_flush.done():
+                self._early_flush = asyncio.ensure_future(self.flush())
+
+    def meter(self, audio_id: str, seconds_per_byte: float):
+        return lambda sent: self.record(audio_id, seconds=sent * seconds_per_byte, bytes_sent=sent)
+
+    def forget(self, audio_id: str):
+        self._pending.pop(audio_id, None)
+
+    def _restore(self, counts: dict):
+        for audio_id, (plays, seconds, bytes_sent) in counts.items():
+            counters = self._pending.setdefault(audio_id, [0, 0.0, 0])
+            counters[0] += plays
+            counters[1] += seconds
+            counters[2] += bytes_sent
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = datetime.utcnow()
+        audio_ids = list(pending)
+        requests = []
+        for audio_id in audio_ids:
+            plays, seconds, bytes_sent = pending[audio_id]
+            update = {"$inc": {"plays": plays, "seconds_listened": seconds, "bytes_served": bytes_sent}}
+            if plays:
+                update["$max"] = {"last_played": now}
+            requests.append(UpdateOne({"audio_id": audio_id}, update, upsert=True))
+        try:
+            await db.play_stats.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            # Only the failed updates are retried; the rest were applied
+            failed = {audio_ids[error["index"]] for error in e.details.get("writeErrors", [])}
+            logger.warning("Play stats flush failed for %d tracks", len(failed))
+            self._restore({audio_id: pending[audio_id] for audio_id in failed})
+        except Exception as e:
+            logger.warning("Play stats flush failed, retrying later: %s", e)
+            self._restore(pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(PLAY_FLUSH_SECONDS)
+            await self.flush()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Whatever is still buffered is written before the client closes
+        tasks = [task for task in (self._task, self._early_flush) if task is not None]
+        if self._task is not None:
+            self._task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+play_tracker = PlayTracker()
+
+# Streaming upload pipeline
+UPLOAD_READ_SIZE = 1024 * 1024  # Bytes pulled from the request per read
+# Per-request limit for resumable chunks; each is stored as one document, so
+# this stays well under MongoDB's 16 MiB document limit
+MAX_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+async def iter_upload_file(file: UploadFile):
+    # Starlette spools uploads to a local temp file, so re-reading is cheap
+    await file.seek(0)
+    while True:
+        piece = await file.read(UPLOAD_READ_SIZE)
+        if not piece:
+            break
+        yield piece
+
+async def claim_existing_blob(content_hash: str) -> Optional[dict]:
+    # Taking a reference first means a concurrent release can't delete it
+    return await db.audio_blobs.find_one_and_update(
+        {"content_hash": content_hash},
+        {"$inc": {"ref_count": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def register_blob(content_hash: str, storage: str, file_id: str, file_size: int, references: int = 1) -> dict:
+    # Another upload of the same bytes may have registered first; $setOnInsert
+    # keeps whichever copy won and the caller discards its own
+    for attempt in range(3):
+        try:
+            return await db.audio_blobs.find_one_and_update(
+                {"content_hash": content_hash},
+                {
+                    "$inc": {"ref_count": references},
+                    "$setOnInsert": {
+                        "storage": storage,
+                        "file_id": file_id,
+                        "file_size": file_size,
+                        "created_date": datetime.utcnow()
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Concurrent upserts on the unique hash index; the retry will match
+            if attempt == 2:
+                raise
+
+async def release_blob(audio_meta: dict):
+    """Drop one reference to a stored blob, deleting the bytes with the last one."""
+    file_id = audio_meta["file_id"]
+    blob = await db.audio_blobs.find_one_and_update(
+        {"file_id": file_id},
+        {"$inc": {"ref_count": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if blob is None:
+        # Uploaded before deduplication existed: the file is never shared
+        await storage_for(audio_meta).delete(file_id)
+        return
+    if blob["ref_count"] <= 0:
+        await drop_unreferenced_blob(blob)
+
+async def drop_unreferenced_blob(blob: dict):
+    result = await db.audio_blobs.delete_one({"_id": blob["_id"], "ref_count": {"$lte": 0}})
+    # A concurrent upload may have claimed the blob again in between
+    if result.deleted_count:
+        await storage_for(blob).delete(blob["file_id"])
+        await db.audio_peaks.delete_one({"content_hash": blob["content_hash"]})
+        await delete_hls(blob["content_hash"])
+
+async def store_audio_stream(filename: str, content_type: str, open_pieces) -> StoredBlob:
+    """Store the bytes produced by open_pieces(), deduplicating by content hash.
+
+    open_pieces is called to get an async iterator of byte pieces and may be
+    called twice: a first pass hashes and probes the content, and only bytes
+    not already stored are written to the default storage backend in a
+    second pass. At most one
+    piece (plus the probe's small windows) is held in memory.
+    """
+    hasher = hashlib.sha256()
+    probe = AudioProbe()
+    async for piece in open_pieces():
+        hasher.update(piece)
+        probe.feed(piece)
+    content_hash = hasher.hexdigest()
+    UPLOAD_BYTES.observe(probe.size)
+
+    existing = await claim_existing_blob(content_hash)
+    if existing is not None:
+        return StoredBlob(
+            storage=existing.get("storage", "gridfs"),
+            file_id=existing["file_id"],
+            file_size=existing["file_size"],
+            content_hash=content_hash,
+            probe=probe.result(),
+            deduplicated=True
+        )
 
-class PlaylistItem(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    title: str
-    audio_items: List[str] = []  # List of audio IDs
-    created_date: datetime = Field(default_factory=datetime.utcnow)
+    writer = default_storage.open_writer(filename, content_type)
+    try:
+        async for piece in open_pieces():
+            await writer.write(piece)
+        await writer.close()
+    except BaseException:
+        # Drop anything already written for the partial file
+        await writer.abort()
+        raise
 
-class PlaylistCreate(BaseModel):
-    title: str
-    audio_items: List[str] = []
+    file_id = writer.file_id
+    blob = await register_blob(content_hash, default_storage.name, file_id, probe.size)
+    if blob["file_id"] != file_id:
+        try:
+            await default_storage.delete(file_id)
+        except Exception as e:
+            # The reference we hold is on the winning copy, so carry on with it
+            logger.warning("Failed to delete duplicate upload %s: %s", file_id, e)
+    return StoredBlob(
+        storage=blob.get("storage", "gridfs"),
+        file_id=blob["file_id"],
+        file_size=probe.size,
+        content_hash=content_hash,
+        probe=probe.result(),
+        deduplicated=blob["file_id"] != file_id
+    )
 
-# Basic routes
-@api_router.get("/")
-async def root():
-    return {"message": "Skiza Audio Player API"}
+async def create_audio_metadata(
+    blob: StoredBlob,
+    mime_type: str,
+    title: str,
+    artist: Optional[str],
+    duration: Optional[float],
+    is_podcast: bool
+) -> AudioMetadata:
+    # Values read from the file win over what the client claimed
+    probe = blob.probe
+    audio_metadata = AudioMetadata(
+        title=title,
+        artist=artist,
+        duration=probe.duration if probe.duration is not None else duration,
+        file_size=blob.file_size,
+        mime_type=probe.mime_type or mime_type,
+        file_id=blob.file_id,
+        storage=blob.storage,
+        content_hash=blob.content_hash,
+        codec=probe.codec,
+        bitrate=probe.bitrate,
+        sample_rate=probe.sample_rate,
+        channels=probe.channels,
+        is_podcast=is_podcast
+    )
+    # Slow post-ingest stages run as background jobs so the upload returns
+    # as soon as the bytes are stored
+    jobs = ingest_jobs_for(blob)
+    if jobs:
+        audio_metadata.processing = "pending"
+    try:
+        await db.audio_metadata.insert_one(audio_metadata.dict())
+        search_index.add(audio_metadata.dict())
+        for job_type in jobs:
+            await job_queue.enqueue(audio_metadata.id, job_type, blob.dict())
+    except Exception:
+        # The blob reference was taken for this upload; hand it back so the
+        # bytes are still deleted along with their last real reference
+        await db.audio_metadata.delete_one({"id": audio_metadata.id})
+        await db.jobs.delete_many({"audio_id": audio_metadata.id})
+        search_index.remove(audio_metadata.id)
+        await release_blob(blob.dict())
+        raise
+    return audio_metadata
 
-@api_router.get("/health")
-async def health_check():
-    return {"status": "healthy", "service": "skiza-audio-player"}
+async def ingest_uploaded_file(
+    file: UploadFile,
+    title: str,
+    artist: Optional[str],
+    duration: Optional[float],
+    is_podcast: bool
+) -> AudioMetadata:
+    # Validate file type
+    if not file.content_type or not file.content_type.startswith('audio/'):
+        raise HTTPException(status_code=400, detail="File must be an audio file")
+
+    # Stream into GridFS without buffering the whole file
+    blob = await store_audio_stream(
+        file.filename,
+        file.content_type,
+        lambda: iter_upload_file(file)
+    )
+
+    return await create_audio_metadata(
+        blob,
+        file.content_type,
+        title,
+        artist,
+        duration,
+        is_podcast
+    )
 
 # Audio upload endpoint
 @api_router.post("/upload-audio", response_model=AudioMetadata)
@@ -84,118 +2286,853 @@ async def upload_audio(
     is_podcast: bool = Form(False)
 ):
     try:
-        # Validate file type
-        if not file.content_type or not file.content_type.startswith('audio/'):
-            raise HTTPException(status_code=400, detail="File must be an audio file")
-        
-        # Read file content
-        file_content = await file.read()
-        
-        # Store in GridFS
-        file_id = fs.put(
-            file_content,
-            filename=file.filename,
-            content_type=file.content_type
+        return await ingest_uploaded_file(file, title, artist, duration, is_podcast)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+# Bulk upload: several files per request, stored concurrently
+BULK_CONCURRENCY = int(os.environ.get('BULK_CONCURRENCY', 4))
+
+@api_router.post("/upload-audio/bulk", response_model=List[BulkUploadResult])
+async def bulk_upload_audio(
+    files: List[UploadFile] = File(...),
+    titles: List[str] = Form([]),
+    artist: Optional[str] = Form(None),
+    is_podcast: bool = Form(False)
+):
+    """Upload many files; titles default to the file name without extension."""
+    if titles and len(titles) != len(files):
+        raise HTTPException(status_code=400, detail="titles must match the number of files")
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+    async def ingest(index: int, file: UploadFile) -> BulkUploadResult:
+        title = titles[index] if titles else Path(file.filename or "untitled").stem
+        async with semaphore:
+            try:
+                audio = await ingest_uploaded_file(file, title, artist, None, is_podcast)
+                return BulkUploadResult(filename=file.filename, success=True, audio=audio)
+            except HTTPException as e:
+                return BulkUploadResult(filename=file.filename, success=False, error=e.detail)
+            except Exception as e:
+                return BulkUploadResult(filename=file.filename, success=False, error=str(e))
+
+    return await asyncio.gather(*(ingest(index, file) for index, file in enumerate(files)))
+
+# Resumable chunked uploads: start a session, PUT numbered chunks, then finalize
+@api_router.post("/uploads", response_model=UploadSession)
+async def start_upload(session: UploadSessionCreate):
+    if not session.content_type.startswith('audio/'):
+        raise HTTPException(status_code=400, detail="File must be an audio file")
+    try:
+        upload_session = UploadSession(**session.dict())
+        await db.upload_sessions.insert_one(upload_session.dict())
+        return upload_session
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start upload: {str(e)}")
+
+@api_router.get("/uploads/{upload_id}", response_model=UploadSession)
+async def get_upload(upload_id: str):
+    upload_session = await db.upload_sessions.find_one({"id": upload_id})
+    if not upload_session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return UploadSession(**upload_session)
+
+@api_router.put("/uploads/{upload_id}/chunks/{index}", response_model=UploadSession)
+async def upload_chunk(upload_id: str, index: int, request: Request):
+    if index < 0:
+        raise HTTPException(status_code=400, detail="Chunk index must be non-negative")
+    upload_session = await db.upload_sessions.find_one({"id": upload_id})
+    if not upload_session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+
+    data = bytearray()
+    async for piece in request.stream():
+        data.extend(piece)
+        if len(data) > MAX_UPLOAD_CHUNK_SIZE:
+            raise HTTPException(status_code=413, detail="Chunk too large")
+    if not data:
+        raise HTTPException(status_code=400, detail="Chunk is empty")
+
+    try:
+        # Re-sending a chunk replaces it, so clients can simply retry
+        previous = await db.upload_chunks.find_one_and_replace(
+            {"upload_id": upload_id, "index": index},
+            {
+                "upload_id": upload_id,
+                "index": index,
+                "size": len(data),
+                "data": Binary(bytes(data)),
+                "created_date": datetime.utcnow()
+            },
+            upsert=True,
+            projection={"size": True}
         )
-        
-        # Create metadata
-        audio_metadata = AudioMetadata(
-            title=title,
-            artist=artist,
-            duration=duration,
-            file_size=len(file_content),
-            mime_type=file.content_type,
-            file_id=str(file_id),
-            is_podcast=is_podcast
+        size_delta = len(data) - (previous["size"] if previous else 0)
+        upload_session = await db.upload_sessions.find_one_and_update(
+            {"id": upload_id},
+            {"$addToSet": {"received_chunks": index}, "$inc": {"received_bytes": size_delta}},
+            return_document=ReturnDocument.AFTER
         )
-        
-        # Store metadata in MongoDB
-        await db.audio_metadata.insert_one(audio_metadata.dict())
-        
+        return UploadSession(**upload_session)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store chunk: {str(e)}")
+
+@api_router.post("/uploads/{upload_id}/finalize", response_model=AudioMetadata)
+async def finalize_upload(upload_id: str):
+    upload_session = await db.upload_sessions.find_one({"id": upload_id})
+    if not upload_session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    received = sorted(upload_session["received_chunks"])
+    if not received:
+        raise HTTPException(status_code=400, detail="No chunks uploaded")
+    if received != list(range(len(received))):
+        missing = sorted(set(range(received[-1] + 1)) - set(received))
+        raise HTTPException(status_code=409, detail=f"Missing chunks: {missing}")
+
+    async def iter_chunks():
+        # One chunk document in memory at a time, in index order
+        for index in received:
+            chunk = await db.upload_chunks.find_one({"upload_id": upload_id, "index": index})
+            yield bytes(chunk["data"])
+
+    try:
+        blob = await store_audio_stream(
+            upload_session["filename"],
+            upload_session["content_type"],
+            iter_chunks
+        )
+        audio_metadata = await create_audio_metadata(
+            blob,
+            upload_session["content_type"],
+            upload_session["title"],
+            upload_session.get("artist"),
+            upload_session.get("duration"),
+            upload_session.get("is_podcast", False)
+        )
+        await db.upload_chunks.delete_many({"upload_id": upload_id})
+        await db.upload_sessions.delete_one({"id": upload_id})
         return audio_metadata
-        
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to finalize upload: {str(e)}")
+
+@api_router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    result = await db.upload_sessions.delete_one({"id": upload_id})
+    if not result.deleted_count:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    await db.upload_chunks.delete_many({"upload_id": upload_id})
+    return {"message": "Upload aborted"}
+
+# Conditional request helpers
+AUDIO_CACHE_CONTROL = os.environ.get('AUDIO_CACHE_CONTROL', 'public, max-age=31536000, immutable')
+METADATA_CACHE_CONTROL = 'no-cache'  # Cache but revalidate; metadata can be deleted
+
+def http_date(dt: datetime) -> str:
+    # upload_date is stored as naive UTC
+    return format_datetime(dt.replace(tzinfo=timezone.utc), usegmt=True)
+
+def audio_etag(audio_meta: dict) -> str:
+    # Stored bytes never change for a given blob, so its hash (or, for files
+    # uploaded before hashing existed, its GridFS id) is a strong validator
+    return f'"{audio_meta.get("content_hash") or audio_meta["file_id"]}"'
+
+def body_etag(body: bytes) -> str:
+    return f'W/"{hashlib.sha1(body).hexdigest()}"'
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison: W/ prefixes are ignored
+        bare = etag[2:] if etag.startswith("W/") else etag
+        return any((tag[2:] if tag.startswith("W/") else tag) == bare for tag in candidates)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return modified <= since
+    return False
+
+def validated_json_response(request: Request, content, headers: Optional[dict] = None, last_modified: Optional[datetime] = None) -> Response:
+    body = orjson.dumps(content)
+    headers = dict(headers or {})
+    headers["ETag"] = body_etag(body)
+    headers["Cache-Control"] = METADATA_CACHE_CONTROL
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    if is_not_modified(request, headers["ETag"], last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Serialization fast path for list endpoints: documents written through the
+# models are already in response shape, so they are projected to the model's
+# fields, topped up with static defaults (for documents stored before a field
+# existed) and encoded straight to JSON with orjson, without building and
+# re-validating a model per row
+def model_defaults(model) -> dict:
+    # Fields with a default_factory are always stored on insert
+    return {
+        name: field.default
+        for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+
+def model_projection(model) -> dict:
+    projection = {"_id": 0}
+    projection.update({name: 1 for name in model.model_fields})
+    return projection
+
+def fill_defaults(documents: List[dict], defaults: dict) -> List[dict]:
+    return [{**defaults, **document} for document in documents]
+
+AUDIO_DEFAULTS = model_defaults(AudioMetadata)
+AUDIO_PROJECTION = model_projection(AudioMetadata)
+PLAYLIST_DEFAULTS = model_defaults(PlaylistItem)
+PLAYLIST_PROJECTION = model_projection(PlaylistItem)
+PLAYLIST_SUMMARY_DEFAULTS = model_defaults(PlaylistSummary)
+PLAYLIST_SUMMARY_PROJECTION = model_projection(PlaylistSummary)
+
+# Library listing: keyset pagination over (upload_date, id)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+AUDIO_FIELDS = set(AudioMetadata.model_fields)
+
+def encode_cursor(doc: dict) -> str:
+    raw = f"{doc['upload_date'].isoformat()}|{doc['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        upload_date, audio_id = raw.split("|", 1)
+        return datetime.fromisoformat(upload_date), audio_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str]) -> Optional[dict]:
+    # id and upload_date are always returned so the next cursor can be built
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - AUDIO_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+    projection = {"_id": 0, "id": 1, "upload_date": 1}
+    projection.update({name: 1 for name in requested})
+    return projection
 
 # Get all audio files
 @api_router.get("/audio", response_model=List[AudioMetadata])
-async def get_audio_files():
+async def get_audio_files(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    is_podcast: Optional[bool] = None,
+    artist: Optional[str] = None,
+    title_prefix: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """List audio oldest-first. The next page's cursor is in X-Next-Cursor."""
     try:
-        audio_files = await db.audio_metadata.find().to_list(1000)
-        return [AudioMetadata(**audio) for audio in audio_files]
+        projection = parse_fields(fields)
+
+        conditions = []
+        if is_podcast is not None:
+            conditions.append({"is_podcast": is_podcast})
+        if artist is not None:
+            conditions.append({"artist": artist})
+        if title_prefix:
+            # Anchored, case-sensitive regex so the title index bounds the scan
+            conditions.append({"title": {"$regex": f"^{re.escape(title_prefix)}"}})
+        if after:
+            after_date, after_id = decode_cursor(after)
+            conditions.append({"$or": [
+                {"upload_date": {"$gt": after_date}},
+                {"upload_date": after_date, "id": {"$gt": after_id}}
+            ]})
+        query = {"$and": conditions} if conditions else {}
+
+        # Fetch one extra row to learn whether another page exists
+        cursor = db.audio_metadata.find(query, projection or AUDIO_PROJECTION)
+        cursor = cursor.sort([("upload_date", 1), ("id", 1)]).limit(limit + 1)
+        audio_files = await cursor.to_list(limit + 1)
+
+        next_cursor = None
+        if len(audio_files) > limit:
+            audio_files = audio_files[:limit]
+            next_cursor = encode_cursor(audio_files[-1])
+
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        if not projection:
+            audio_files = fill_defaults(audio_files, AUDIO_DEFAULTS)
+        # Encoded here rather than via the response model so the body can be
+        # hashed into an ETag (and partial projections stay valid)
+        return validated_json_response(request, audio_files, headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch audio files: {str(e)}")
 
+# Most played tracks, read straight from the play_stats counters
+@api_router.get("/audio/top", response_model=List[TopTrack])
+async def get_top_audio(
+    limit: int = Query(20, ge=1, le=100),
+    by: str = Query("plays", pattern="^(plays|seconds_listened)$")
+):
+    try:
+        top = []
+        skip = 0
+        while len(top) < limit:
+            cursor = db.play_stats.find({by: {"$gt": 0}}, {"_id": 0}).sort(
+                [(by, -1), ("audio_id", -1)]
+            ).skip(skip).limit(limit)
+            stats = await cursor.to_list(limit)
+            if not stats:
+                break
+            skip += len(stats)
+            audio_metas = await get_audio_metas([entry["audio_id"] for entry in stats])
+            # A flush racing a delete can leave stats for a removed track behind
+            orphaned = [entry["audio_id"] for entry in stats if entry["audio_id"] not in audio_metas]
+            if orphaned:
+                result = await db.play_stats.delete_many({"audio_id": {"$in": orphaned}})
+                skip -= result.deleted_count
+            top.extend(
+                TopTrack(audio=AudioMetadata(**audio_metas[entry["audio_id"]]), **entry)
+                for entry in stats
+                if entry["audio_id"] in audio_metas
+            )
+        return top[:limit]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch top tracks: {str(e)}")
+
+# Search titles and artists; the last word may be partial while typing
+@api_router.get("/audio/search", response_model=AudioSearchPage)
+async def search_audio(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    offset: int = Query(0, ge=0, le=10000),
+    limit: int = Query(20, ge=1, le=100),
+    is_podcast: Optional[bool] = None
+):
+    try:
+        try:
+            await asyncio.wait_for(search_index.ready.wait(), SEARCH_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Search index is still loading")
+        audio_ids, total = search_index.search(q, offset, limit, is_podcast)
+        documents = {}
+        if audio_ids:
+            cursor = db.audio_metadata.find({"id": {"$in": audio_ids}}, AUDIO_PROJECTION)
+            async for document in cursor:
+                documents[document["id"]] = document
+        results = []
+        for audio_id in audio_ids:
+            if audio_id in documents:
+                results.append(documents[audio_id])
+            else:
+                # Deleted by another worker since it was indexed
+                search_index.remove(audio_id)
+                total -= 1
+        return validated_json_response(request, {
+            "query": q,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "results": fill_defaults(results, AUDIO_DEFAULTS)
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
 # Get specific audio file
 @api_router.get("/audio/{audio_id}", response_model=AudioMetadata)
-async def get_audio_file(audio_id: str):
+async def get_audio_file(audio_id: str, request: Request):
     try:
-        audio = await db.audio_metadata.find_one({"id": audio_id})
+        audio = await get_audio_meta(audio_id)
         if not audio:
             raise HTTPException(status_code=404, detail="Audio file not found")
-        return AudioMetadata(**audio)
+        return validated_json_response(
+            request,
+            jsonable_encoder(AudioMetadata(**audio)),
+            last_modified=audio["upload_date"]
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch audio file: {str(e)}")
 
+@api_router.get("/audio/{audio_id}/peaks")
+async def get_audio_peaks(
+    audio_id: str,
+    request: Request,
+    level: int = Query(0, ge=0, lt=len(PEAK_LEVELS)),
+    format: str = Query("json", pattern="^(json|binary)$")
+):
+    """Waveform peaks for one zoom level (0 is the finest).
+
+    format=binary returns the raw interleaved int8 (min, max) pairs, scaled
+    so 127 is full scale; format=json returns the same values as a list.
+    """
+    try:
+        audio_meta = await get_audio_meta(audio_id)
+        if not audio_meta:
+            raise HTTPException(status_code=404, detail="Audio file not found")
+        content_hash = audio_meta.get("content_hash")
+        peaks = None
+        if content_hash:
+            peaks = await db.audio_peaks.find_one(
+                {"content_hash": content_hash},
+                {"_id": 0, "sample_rate": 1, "channels": 1, "levels": {"$slice": [level, 1]}}
+            )
+        if not peaks or not peaks.get("levels"):
+            raise HTTPException(status_code=404, detail="Peaks not available for this audio file")
+        peak_level = peaks["levels"][0]
+
+        # Peaks are derived from immutable bytes, so they cache like the audio
+        headers = {
+            "ETag": f'"{content_hash}-peaks-{level}-{format}"',
+            "Cache-Control": AUDIO_CACHE_CONTROL,
+            "X-Samples-Per-Peak": str(peak_level["samples_per_peak"]),
+            "X-Sample-Rate": str(peaks["sample_rate"])
+        }
+        if is_not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        data = bytes(peak_level["data"])
+        if format == "binary":
+            return Response(content=data, media_type="application/octet-stream", headers=headers)
+        return JSONResponse(
+            content={
+                "audio_id": audio_id,
+                "sample_rate": peaks["sample_rate"],
+                "samples_per_peak": peak_level["samples_per_peak"],
+                "length": peak_level["length"],
+                "peaks": np.frombuffer(data, np.int8).tolist()
+            },
+            headers=headers
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch peaks: {str(e)}")
+
+@api_router.get("/audio/{audio_id}/jobs")
+async def get_audio_jobs(audio_id: str):
+    try:
+        audio_meta = await db.audio_metadata.find_one({"id": audio_id}, {"_id": 0, "processing": 1})
+        if not audio_meta:
+            raise HTTPException(status_code=404, detail="Audio file not found")
+        jobs = await db.jobs.find({"audio_id": audio_id}, {"_id": 0, "payload": 0}).sort("created_date", 1).to_list(None)
+        return {
+            "audio_id": audio_id,
+            "processing": audio_meta.get("processing", "done"),
+            "jobs": jsonable_encoder(jobs)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch jobs: {str(e)}")
+
+# Range request helpers
+MAX_BYTE_RANGES = 16
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a bytes Range header into inclusive (start, end) pairs.
+
+    Returns None when the header is absent or malformed (serve the full body)
+    and raises 416 when none of the requested ranges can be satisfied.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(file_size - length, 0), file_size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else file_size - 1
+                if last and end < start:
+                    return None
+                if start >= file_size:
+                    continue
+                end = min(end, file_size - 1)
+        except ValueError:
+            return None
+        ranges.append((start, end))
+
+    if not ranges:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    if len(ranges) > MAX_BYTE_RANGES:
+        return None
+
+    # Coalesce overlapping or adjacent ranges so no byte is sent twice
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def if_range_matches(if_range: Optional[str], audio_meta: dict) -> bool:
+    # A stale validator means the client must get the whole current file.
+    # If-Range requires strong comparison, which audio_etag() provides.
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    return if_range in (audio_etag(audio_meta), http_date(audio_meta["upload_date"]))
+
 # Stream audio file
 @api_router.get("/audio/{audio_id}/stream")
-async def stream_audio(audio_id: str):
+async def stream_audio(
+    audio_id: str,
+    request: Request,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range")
+):
     try:
         # Get metadata
-        audio_meta = await db.audio_metadata.find_one({"id": audio_id})
+        audio_meta = await get_audio_meta(audio_id)
         if not audio_meta:
             raise HTTPException(status_code=404, detail="Audio file not found")
         
-        # Get file from GridFS
-        file_id = ObjectId(audio_meta["file_id"])
-        grid_file = fs.get(file_id)
-        
-        def generate():
-            while True:
-                chunk = grid_file.read(8192)
-                if not chunk:
-                    break
-                yield chunk
-        
+        storage = storage_for(audio_meta)
+        file_id = audio_meta["file_id"]
+        local_path = storage.local_path(file_id)
+        file_size = audio_meta["file_size"]
+        mime_type = audio_meta["mime_type"]
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": audio_etag(audio_meta),
+            "Last-Modified": http_date(audio_meta["upload_date"]),
+            "Cache-Control": AUDIO_CACHE_CONTROL
+        }
+        if is_not_modified(request, headers["ETag"], audio_meta["upload_date"]):
+            return Response(status_code=304, headers=headers)
+
+        ranges = None
+        if if_range_matches(if_range, audio_meta):
+            ranges = parse_range_header(range_header, file_size)
+
+        duration = audio_meta.get("duration")
+        meter = play_tracker.meter(audio_id, duration / file_size if duration and file_size else 0.0)
+
+        if not ranges or len(ranges) == 1:
+            status_code = 200
+            start, end = 0, file_size - 1
+            if ranges:
+                status_code = 206
+                start, end = ranges[0]
+                headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            if start == 0 and request.method == "GET" and (end >= PLAY_PROBE_BYTES or end == file_size - 1):
+                play_tracker.record(audio_id, plays=1)
+            if local_path is not None:
+                return LocalFileRangeResponse(local_path, start, end, status_code, headers, mime_type, on_sent=meter)
+            return StreamingResponse(
+                metered(read_range(storage, file_id, start, end, file_size), meter),
+                status_code=status_code,
+                media_type=mime_type,
+                headers=headers
+            )
+
+        # Multiple ranges: multipart/byteranges body
+        boundary = uuid.uuid4().hex
+        part_headers = [
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {mime_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+            ).encode()
+            for start, end in ranges
+        ]
+        closing = f"\r\n--{boundary}--\r\n".encode()
+        content_length = sum(len(h) for h in part_headers) + len(closing)
+        content_length += sum(end - start + 1 for start, end in ranges)
+        content_length += 2 * (len(ranges) - 1)  # CRLF between parts
+
+        async def generate_multipart():
+            for index, (start, end) in enumerate(ranges):
+                if index:
+                    yield b"\r\n"
+                yield part_headers[index]
+                async for chunk in read_range(storage, file_id, start, end, file_size):
+                    yield chunk
+            yield closing
+
+        headers["Content-Length"] = str(content_length)
         return StreamingResponse(
-            generate(),
-            media_type=audio_meta["mime_type"],
-            headers={
-                "Accept-Ranges": "bytes",
-                "Content-Length": str(audio_meta["file_size"]),
-                "Cache-Control": "no-cache"
-            }
+            metered(generate_multipart(), meter),
+            status_code=206,
+            media_type=f"multipart/byteranges; boundary={boundary}",
+            headers=headers
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to stream audio: {str(e)}")
 
+# HLS delivery: playlist and segments are immutable per content hash, so
+# both are served with the long-lived audio cache headers
+@api_router.get("/audio/{audio_id}/hls/index.m3u8")
+async def get_hls_playlist(audio_id: str, request: Request):
+    try:
+        audio_meta = await get_audio_meta(audio_id)
+        if not audio_meta:
+            raise HTTPException(status_code=404, detail="Audio file not found")
+        hls = await ensure_hls(audio_meta)
+        if not hls:
+            raise HTTPException(status_code=404, detail="HLS is not available for this audio file")
+
+        headers = {
+            "ETag": f'"{audio_meta["content_hash"]}-hls"',
+            "Cache-Control": AUDIO_CACHE_CONTROL
+        }
+        if is_not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{hls['target_duration']}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:VOD"
+        ]
+        for index, segment in enumerate(hls["segments"]):
+            lines.append(f"#EXTINF:{segment['duration']:.3f},")
+            lines.append(f"{index}.mp3")
+        lines.append("#EXT-X-ENDLIST")
+        return Response(
+            content="\n".join(lines) + "\n",
+            media_type="application/vnd.apple.mpegurl",
+            headers=headers
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build HLS playlist: {str(e)}")
+
+@api_router.get("/audio/{audio_id}/hls/{index}.mp3")
+async def get_hls_segment(audio_id: str, index: int, request: Request):
+    try:
+        audio_meta = await get_audio_meta(audio_id)
+        if not audio_meta:
+            raise HTTPException(status_code=404, detail="Audio file not found")
+        segment = None
+        if audio_meta.get("content_hash") and index >= 0:
+            hls = await db.audio_hls.find_one(
+                {"content_hash": audio_meta["content_hash"]},
+                {"_id": 0, "segments": {"$slice": [index, 1]}}
+            )
+            if hls and hls["segments"]:
+                segment = hls["segments"][0]
+        if segment is None:
+            raise HTTPException(status_code=404, detail="HLS segment not found")
+
+        storage = storage_for(segment)
+        file_id = segment["file_id"]
+        size = segment["size"]
+        headers = {
+            "ETag": f'"{audio_meta["content_hash"]}-hls-{index}"',
+            "Cache-Control": AUDIO_CACHE_CONTROL,
+            "Content-Length": str(size)
+        }
+        if is_not_modified(request, headers["ETag"]):
+            del headers["Content-Length"]
+            return Response(status_code=304, headers=headers)
+        if index == 0:
+            play_tracker.record(audio_id, plays=1)
+        meter = play_tracker.meter(audio_id, segment["duration"] / size if size else 0.0)
+        local_path = storage.local_path(file_id)
+        if local_path is not None:
+            return LocalFileRangeResponse(local_path, 0, size - 1, 200, headers, "audio/mpeg", on_sent=meter)
+        return StreamingResponse(
+            metered(read_range(storage, file_id, 0, size - 1, size), meter),
+            media_type="audio/mpeg",
+            headers=headers
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to stream HLS segment: {str(e)}")
+
+async def remove_audio_blob(audio_meta: dict):
+    await release_blob(audio_meta)
+    byte_cache.invalidate(audio_meta["file_id"])
+
+async def forget_audio(audio_metas: List[dict]):
+    # Everything that refers to audio whose metadata has been deleted
+    audio_ids = [audio_meta["id"] for audio_meta in audio_metas]
+    for audio_meta in audio_metas:
+        await remove_from_playlists(audio_meta)
+    await db.jobs.delete_many({"audio_id": {"$in": audio_ids}})
+    await db.play_stats.delete_many({"audio_id": {"$in": audio_ids}})
+    for audio_id in audio_ids:
+        play_tracker.forget(audio_id)
+        metadata_cache.invalidate(audio_id)
+        search_index.remove(audio_id)
+
 # Delete audio file
 @api_router.delete("/audio/{audio_id}")
 async def delete_audio(audio_id: str):
     try:
-        # Get metadata
-        audio_meta = await db.audio_metadata.find_one({"id": audio_id})
+        # Deleting the metadata claims it: of two concurrent deletes only the
+        # one that removed the document releases the blob reference
+        audio_meta = await db.audio_metadata.find_one_and_delete({"id": audio_id})
         if not audio_meta:
             raise HTTPException(status_code=404, detail="Audio file not found")
-        
-        # Delete file from GridFS
-        file_id = ObjectId(audio_meta["file_id"])
-        fs.delete(file_id)
-        
-        # Delete metadata
-        await db.audio_metadata.delete_one({"id": audio_id})
-        
+
+        await forget_audio([audio_meta])
+        await remove_audio_blob(audio_meta)
+
         return {"message": "Audio file deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete audio file: {str(e)}")
 
-# Playlist endpoints
+@api_router.post("/audio/bulk-delete", response_model=BulkDeleteResult)
+async def bulk_delete_audio(request: BulkDeleteRequest):
+    try:
+        audio_ids = list(dict.fromkeys(request.ids))
+        semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+        async def claim(audio_id: str) -> Optional[dict]:
+            async with semaphore:
+                return await db.audio_metadata.find_one_and_delete({"id": audio_id})
+
+        # Only documents this request removed are released, so an overlapping
+        # delete of the same ids can't drop a reference twice
+        claimed = [m for m in await asyncio.gather(*(claim(audio_id) for audio_id in audio_ids)) if m]
+        found = {audio_meta["id"] for audio_meta in claimed}
+        await forget_audio(claimed)
+
+        async def remove(audio_meta: dict) -> Optional[BulkDeleteFailure]:
+            async with semaphore:
+                try:
+                    await remove_audio_blob(audio_meta)
+                except Exception as e:
+                    return BulkDeleteFailure(id=audio_meta["id"], error=str(e))
+            return None
+
+        failures = [f for f in await asyncio.gather(*(remove(m) for m in claimed)) if f]
+        failed_ids = {failure.id for failure in failures}
+        return BulkDeleteResult(
+            deleted=[audio_id for audio_id in audio_ids if audio_id in found and audio_id not in failed_ids],
+            not_found=[audio_id for audio_id in audio_ids if audio_id not in found],
+            failed=failures
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk delete failed: {str(e)}")
+
+# Playlist endpoints. Track lists are edited in place with single atomic
+# updates ($push with $position, or pipeline updates guarded on the track
+# expected at a position), and every update adjusts the denormalized totals
+# in the same write, so summaries never need the tracks themselves
+PLAYLIST_TAIL = 2 ** 31 - 1  # $slice length that reaches the end of any array
+
+def track_totals(audio_ids: List[str], audio_metas: dict) -> dict:
+    totals = {"track_count": len(audio_ids), "total_duration": 0.0, "total_bytes": 0}
+    for audio_id in audio_ids:
+        audio_meta = audio_metas.get(audio_id)
+        if audio_meta:
+            totals["total_duration"] += audio_meta.get("duration") or 0.0
+            totals["total_bytes"] += audio_meta.get("file_size") or 0
+    return totals
+
+def splice_tracks(position: int, remove: int = 0, insert: Optional[List[str]] = None) -> dict:
+    # Expression for audio_items[:position] + insert + audio_items[position + remove:]
+    parts = [{"$slice": ["$audio_items", position]}] if position else []
+    if insert:
+        parts.append({"$literal": insert})
+    parts.append({"$slice": ["$audio_items", position + remove, PLAYLIST_TAIL]})
+    return {"$concatArrays": parts}
+
+def shrink_totals(count, audio_meta: Optional[dict]) -> dict:
+    # Pipeline $set fields taking `count` copies of a track off the totals
+    duration = (audio_meta or {}).get("duration") or 0.0
+    size = (audio_meta or {}).get("file_size") or 0
+    return {
+        "track_count": {"$subtract": ["$track_count", count]},
+        "total_duration": {"$max": [0.0, {"$subtract": ["$total_duration", {"$multiply": [count, duration]}]}]},
+        "total_bytes": {"$max": [0, {"$subtract": ["$total_bytes", {"$multiply": [count, size]}]}]},
+    }
+
+async def remove_from_playlists(audio_meta: dict):
+    # Every occurrence of a deleted track goes, one atomic update per playlist
+    audio_id = {"$literal": audio_meta["id"]}
+    occurrences = {"$size": {"$filter": {"input": "$audio_items", "cond": {"$eq": ["$$this", audio_id]}}}}
+    await db.playlists.update_many({"audio_items": audio_meta["id"]}, [{"$set": {
+        "audio_items": {"$filter": {"input": "$audio_items", "cond": {"$ne": ["$$this", audio_id]}}},
+        **shrink_totals(occurrences, audio_meta),
+        "updated_date": datetime.utcnow()
+    }}])
+
+async def refresh_playlist_totals(query: dict):
+    # Recomputes totals from the tracks; skipped if the list changed meanwhile
+    cursor = db.playlists.find(query, {"_id": 0, "id": 1, "audio_items": 1})
+    async for playlist in cursor:
+        audio_metas = await get_audio_metas(playlist["audio_items"])
+        await db.playlists.update_one(
+            {"id": playlist["id"], "audio_items": playlist["audio_items"]},
+            {"$set": {**track_totals(playlist["audio_items"], audio_metas), "updated_date": datetime.utcnow()}}
+        )
+
+async def playlist_track_at(playlist_id: str, position: int) -> Tuple[str, int]:
+    playlist = await db.playlists.find_one(
+        {"id": playlist_id},
+        {"_id": 0, "track_count": 1, "audio_items": {"$slice": [position, 1]}}
+    )
+    if not playlist:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    if not playlist["audio_items"]:
+        raise HTTPException(status_code=404, detail="Track not found")
+    return playlist["audio_items"][0], playlist.get("track_count", 0)
+
+def playlists_last_modified(playlists: List[dict]) -> Optional[datetime]:
+    # Playlists are never deleted, so a list changes only when one of its entries does
+    return max((playlist["updated_date"] for playlist in playlists if playlist.get("updated_date")), default=None)
+
 @api_router.post("/playlists", response_model=PlaylistItem)
 async def create_playlist(playlist: PlaylistCreate):
     try:
+        audio_metas = await get_audio_metas(playlist.audio_items)
         playlist_item = PlaylistItem(
             title=playlist.title,
-            audio_items=playlist.audio_items
+            audio_items=playlist.audio_items,
+            **track_totals(playlist.audio_items, audio_metas)
         )
         await db.playlists.insert_one(playlist_item.dict())
         return playlist_item
@@ -203,23 +3140,625 @@ async def create_playlist(playlist: PlaylistCreate):
         raise HTTPException(status_code=500, detail=f"Failed to create playlist: {str(e)}")
 
 @api_router.get("/playlists", response_model=List[PlaylistItem])
-async def get_playlists():
+async def get_playlists(request: Request):
+    try:
+        playlists = await db.playlists.find({}, PLAYLIST_PROJECTION).to_list(1000)
+        return validated_json_response(
+            request,
+            fill_defaults(playlists, PLAYLIST_DEFAULTS),
+            last_modified=playlists_last_modified(playlists)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch playlists: {str(e)}")
+
+@api_router.get("/playlists/summaries", response_model=List[PlaylistSummary])
+async def get_playlist_summaries(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Playlists with their totals but without track ids, oldest first."""
     try:
-        playlists = await db.playlists.find().to_list(1000)
-        return [PlaylistItem(**playlist) for playlist in playlists]
+        cursor = db.playlists.find({}, PLAYLIST_SUMMARY_PROJECTION).sort(
+            [("created_date", ASCENDING), ("id", ASCENDING)]
+        ).skip(offset).limit(limit)
+        summaries = await cursor.to_list(limit)
+        return validated_json_response(
+            request,
+            fill_defaults(summaries, PLAYLIST_SUMMARY_DEFAULTS),
+            last_modified=playlists_last_modified(summaries)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch playlists: {str(e)}")
 
+@api_router.post("/playlists/{playlist_id}/tracks", response_model=PlaylistSummary)
+async def add_playlist_tracks(playlist_id: str, tracks: PlaylistTracksAdd):
+    try:
+        audio_metas = await get_audio_metas(tracks.audio_ids)
+        for audio_id in tracks.audio_ids:
+            if audio_id not in audio_metas:
+                raise HTTPException(status_code=404, detail=f"Audio file not found: {audio_id}")
+
+        push = {"$each": tracks.audio_ids}
+        if tracks.position is not None:
+            push["$position"] = tracks.position
+        playlist = await db.playlists.find_one_and_update(
+            {"id": playlist_id},
+            {
+                "$push": {"audio_items": push},
+                "$inc": track_totals(tracks.audio_ids, audio_metas),
+                "$set": {"updated_date": datetime.utcnow()}
+            },
+            projection=PLAYLIST_SUMMARY_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if not playlist:
+            raise HTTPException(status_code=404, detail="Playlist not found")
+
+        # A track deleted while this was in flight escaped its delete's cleanup
+        remaining = set(await db.audio_metadata.distinct("id", {"id": {"$in": tracks.audio_ids}}))
+        vanished = set(tracks.audio_ids) - remaining
+        if vanished:
+            for audio_id in vanished:
+                await remove_from_playlists(audio_metas[audio_id])
+            playlist = await db.playlists.find_one({"id": playlist_id}, PLAYLIST_SUMMARY_PROJECTION)
+        return PlaylistSummary(**playlist)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to add tracks: {str(e)}")
+
+@api_router.delete("/playlists/{playlist_id}/tracks/{position}", response_model=PlaylistSummary)
+async def remove_playlist_track(playlist_id: str, position: int):
+    if position < 0:
+        raise HTTPException(status_code=400, detail="Position must be non-negative")
+    try:
+        audio_id, _ = await playlist_track_at(playlist_id, position)
+        audio_meta = (await get_audio_metas([audio_id])).get(audio_id)
+        playlist = await db.playlists.find_one_and_update(
+            {"id": playlist_id, f"audio_items.{position}": audio_id},
+            [{"$set": {
+                "audio_items": splice_tracks(position, remove=1),
+                **shrink_totals(1, audio_meta),
+                "updated_date": datetime.utcnow()
+            }}],
+            projection=PLAYLIST_SUMMARY_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if not playlist:
+            raise HTTPException(status_code=409, detail="Playlist changed, retry the request")
+        return PlaylistSummary(**playlist)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to remove track: {str(e)}")
+
+@api_router.post("/playlists/{playlist_id}/tracks/move", response_model=PlaylistSummary)
+async def move_playlist_track(playlist_id: str, move: PlaylistTrackMove):
+    try:
+        audio_id, track_count = await playlist_track_at(playlist_id, move.from_position)
+        if move.to_position >= track_count:
+            raise HTTPException(status_code=400, detail="to_position is past the end of the playlist")
+        # Matching the length too keeps to_position meaning what the client saw
+        playlist = await db.playlists.find_one_and_update(
+            {"id": playlist_id, f"audio_items.{move.from_position}": audio_id, "track_count": track_count},
+            [
+                {"$set": {"audio_items": splice_tracks(move.from_position, remove=1)}},
+                {"$set": {
+                    "audio_items": splice_tracks(move.to_position, insert=[audio_id]),
+                    "updated_date": datetime.utcnow()
+                }},
+            ],
+            projection=PLAYLIST_SUMMARY_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if not playlist:
+            raise HTTPException(status_code=409, detail="Playlist changed, retry the request")
+        return PlaylistSummary(**playlist)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to move track: {str(e)}")
+
 @api_router.get("/playlists/{playlist_id}", response_model=PlaylistItem)
-async def get_playlist(playlist_id: str):
+async def get_playlist(playlist_id: str, request: Request):
     try:
         playlist = await db.playlists.find_one({"id": playlist_id})
         if not playlist:
             raise HTTPException(status_code=404, detail="Playlist not found")
-        return PlaylistItem(**playlist)
+        return validated_json_response(
+            request,
+            jsonable_encoder(PlaylistItem(**playlist)),
+            last_modified=playlists_last_modified([playlist])
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch playlist: {str(e)}")
 
+async def get_audio_metas(audio_ids: List[str]) -> dict:
+    # Resolve many ids with one $in query, serving what we can from the cache
+    found = {}
+    uncached = []
+    for audio_id in set(audio_ids):
+        audio_meta = metadata_cache.get(audio_id)
+        if audio_meta is None:
+            uncached.append(audio_id)
+        else:
+            found[audio_id] = audio_meta
+    if uncached:
+        cursor = db.audio_metadata.find({"id": {"$in": uncached}}, {"_id": 0})
+        async for audio_meta in cursor:
+            metadata_cache.set(audio_meta["id"], audio_meta)
+            found[audio_meta["id"]] = audio_meta
+    return found
+
+@api_router.get("/playlists/{playlist_id}/tracks", response_model=PlaylistTracksPage)
+async def get_playlist_tracks(
+    playlist_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Expanded playlist read: one page of tracks with their metadata, in playlist order."""
+    try:
+        # Slice the id array server-side so long playlists are never loaded whole
+        pipeline = [
+            {"$match": {"id": playlist_id}},
+            {"$project": {
+                "_id": 0,
+                "title": 1,
+                "total": {"$size": "$audio_items"},
+                "audio_items": {"$slice": ["$audio_items", offset, limit]}
+            }}
+        ]
+        playlists = await db.playlists.aggregate(pipeline).to_list(1)
+        if not playlists:
+            raise HTTPException(status_code=404, detail="Playlist not found")
+        playlist = playlists[0]
+
+        audio_metas = await get_audio_metas(playlist["audio_items"])
+        tracks = []
+        for position, audio_id in enumerate(playlist["audio_items"], start=offset):
+            audio_meta = audio_metas.get(audio_id)
+            tracks.append(PlaylistTrack(
+                position=position,
+                audio_id=audio_id,
+                missing=audio_meta is None,
+                audio=AudioMetadata(**audio_meta) if audio_meta else None
+            ))
+        return PlaylistTracksPage(
+            playlist_id=playlist_id,
+            title=playlist["title"],
+            total=playlist["total"],
+            offset=offset,
+            limit=limit,
+            tracks=tracks
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch playlist tracks: {str(e)}")
+
+# Catalogue export and import: audio metadata and playlists stream out of
+# batched cursors as NDJSON, one {"collection", "document"} record per line,
+# so memory stays flat however large the library is. format=tar also carries
+# the audio bytes: blob members come first ("blobs/<content_hash>", or
+# "files/<audio_id>" for audio stored before deduplication), followed by
+# catalogue members that add the waveform peaks.
+EXPORT_BATCH_SIZE = 1000  # Documents per cursor batch
+EXPORT_MEMBER_BYTES = 8 * 1024 * 1024  # Catalogue bytes per tar member
+CATALOGUE_COLLECTIONS = ["audio_metadata", "playlists"]
+ARCHIVE_COLLECTIONS = ["audio_peaks"] + CATALOGUE_COLLECTIONS
+IMPORT_BATCH_SIZE = 1000  # Documents per insert_many / bulk_write
+IMPORT_CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', 4))  # Blobs written at once
+IMPORT_QUEUE_PIECES = 4  # Pieces buffered per blob while its write catches up
+
+def encode_export_value(value):
+    # Peak data is stored as BSON binary
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+def export_line(collection: str, document: dict) -> bytes:
+    record = {"collection": collection, "document": document}
+    return orjson.dumps(record, default=encode_export_value) + b"\n"
+
+async def iter_catalogue_lines(collections: List[str]):
+    for collection in collections:
+        cursor = db[collection].find({}, {"_id": 0}).batch_size(EXPORT_BATCH_SIZE)
+        async for document in cursor:
+            yield export_line(collection, document)
+
+async def iter_ndjson_export(collections: List[str]):
+    # Lines are coalesced so the response isn't sent one small write per document
+    buffer = bytearray()
+    async for line in iter_catalogue_lines(collections):
+        buffer += line
+        if len(buffer) >= STREAM_READ_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+def tar_header(name: str, size: int) -> bytes:
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mode = 0o644
+    info.mtime = int(time.time())
+    return info.tobuf(format=tarfile.USTAR_FORMAT)
+
+def tar_padding(size: int) -> bytes:
+    return b"\0" * (-size % tarfile.BLOCKSIZE)
+
+async def iter_tar_member(name: str, size: int, chunks):
+    yield tar_header(name, size)
+    sent = 0
+    async for chunk in chunks:
+        sent += len(chunk)
+        yield chunk
+    if sent != size:
+        # The header already promised `size` bytes; a short member would corrupt the archive
+        raise RuntimeError(f"Export of {name} read {sent} of {size} bytes")
+    yield tar_padding(size)
+
+async def iter_tar_export():
+    blobs = db.audio_blobs.find({}, {"_id": 0}).batch_size(EXPORT_BATCH_SIZE)
+    async for blob in blobs:
+        storage = storage_for(blob)
+        chunks = storage.iter_range(blob["file_id"], 0, blob["file_size"] - 1)
+        async for piece in iter_tar_member(f"blobs/{blob['content_hash']}", blob["file_size"], chunks):
+            yield piece
+
+    legacy = db.audio_metadata.find(
+        {"content_hash": None},
+        {"_id": 0, "id": 1, "file_id": 1, "file_size": 1, "storage": 1}
+    ).batch_size(EXPORT_BATCH_SIZE)
+    async for audio_meta in legacy:
+        storage = storage_for(audio_meta)
+        chunks = storage.iter_range(audio_meta["file_id"], 0, audio_meta["file_size"] - 1)
+        async for piece in iter_tar_member(f"files/{audio_meta['id']}", audio_meta["file_size"], chunks):
+            yield piece
+
+    member = bytearray()
+    index = 0
+    async for line in iter_catalogue_lines(ARCHIVE_COLLECTIONS):
+        member += line
+        if len(member) >= EXPORT_MEMBER_BYTES:
+            yield tar_header(f"catalogue/{index:06d}.ndjson", len(member)) + bytes(member) + tar_padding(len(member))
+            member.clear()
+            index += 1
+    if member:
+        yield tar_header(f"catalogue/{index:06d}.ndjson", len(member)) + bytes(member) + tar_padding(len(member))
+    # End-of-archive marker
+    yield b"\0" * (2 * tarfile.BLOCKSIZE)
+
+class ByteStreamReader:
+    """Buffered reads over an async iterator of byte chunks, e.g. request.stream()."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks.__aiter__()
+        self._buffer = bytearray()
+        self._eof = False
+
+    async def _fill(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def _take(self, size: int) -> bytes:
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def read(self, size: int) -> bytes:
+        # Returns up to `size` bytes; empty only at the end of the stream
+        while not self._buffer and await self._fill():
+            pass
+        return self._take(size)
+
+    async def readexactly(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            if not await self._fill():
+                raise ValueError("Unexpected end of import stream")
+        return self._take(size)
+
+    async def skip(self, size: int):
+        while size > 0:
+            piece = await self.read(min(UPLOAD_READ_SIZE, size))
+            if not piece:
+                raise ValueError("Unexpected end of import stream")
+            size -= len(piece)
+
+    async def readline(self) -> bytes:
+        searched = 0
+        while True:
+            newline = self._buffer.find(b"\n", searched)
+            if newline >= 0:
+                return self._take(newline + 1)
+            searched = len(self._buffer)
+            if not await self._fill():
+                return self._take(len(self._buffer))
+
+async def insert_unordered(collection, documents: List[dict]) -> set:
+    """insert_many that skips documents whose unique id already exists.
+
+    Returns the indexes of the skipped documents, so re-running an import
+    only adds what is missing. Any other write error is raised.
+    """
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        return {error["index"] for error in errors}
+    return set()
+
+async def adjust_blob_refs(counts: Counter, sign: int):
+    if counts:
+        await db.audio_blobs.bulk_write(
+            [UpdateOne({"content_hash": content_hash}, {"$inc": {"ref_count": sign * count}})
+             for content_hash, count in counts.items()],
+            ordered=False
+        )
+
+class CatalogueImporter:
+    """Applies an export stream to this database.
+
+    Documents are validated through the models and written in unordered
+    batches. Blob members are hashed and written to the default storage
+    backend by up to IMPORT_CONCURRENCY tasks while the stream keeps being
+    read, and imported audio is relinked to whichever copy of its content
+    this database holds.
+    """
+
+    def __init__(self):
+        self.result = ImportResult()
+        self._handlers = {
+            "audio_peaks": self._upsert_peaks,
+            "audio_metadata": self._insert_audio,
+            "playlists": self._insert_playlists,
+        }
+        self._batches = {collection: [] for collection in self._handlers}
+        self._slots = asyncio.Semaphore(IMPORT_CONCURRENCY)
+        self._pending = set()
+        self._legacy_hashes = {}  # audio_id -> content hash of its "files/" member
+        self._created = []  # Hashes of blobs this import stored
+        self._playlist_ids = []  # Imported playlists, totalled once their audio is in
+
+    async def add_line(self, line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        record = orjson.loads(line)
+        collection = record.get("collection")
+        if collection not in self._batches:
+            raise ValueError(f"Unknown collection in import stream: {collection}")
+        batch = self._batches[collection]
+        batch.append(record["document"])
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await self._flush(collection)
+
+    async def _flush(self, collection: str):
+        batch = self._batches[collection]
+        if batch:
+            self._batches[collection] = []
+            await self._handlers[collection](batch)
+
+    async def _insert_playlists(self, documents: List[dict]):
+        playlists = [PlaylistItem(**document).dict() for document in documents]
+        skipped = await insert_unordered(db.playlists, playlists)
+        self._playlist_ids.extend(
+            playlist["id"] for index, playlist in enumerate(playlists) if index not in skipped
+        )
+        self.result.playlists_imported += len(playlists) - len(skipped)
+        self.result.playlists_skipped += len(skipped)
+
+    async def _insert_audio(self, documents: List[dict]):
+        audio = []
+        for document in documents:
+            audio_meta = AudioMetadata(**document).dict()
+            if not audio_meta["content_hash"]:
+                audio_meta["content_hash"] = self._legacy_hashes.pop(audio_meta["id"], None)
+            audio.append(audio_meta)
+
+        # References are taken before inserting so a concurrent delete can't drop a shared blob
+        counts = Counter(audio_meta["content_hash"] for audio_meta in audio if audio_meta["content_hash"])
+        await adjust_blob_refs(counts, 1)
+        blobs = {}
+        if counts:
+            cursor = db.audio_blobs.find(
+                {"content_hash": {"$in": list(counts)}},
+                {"_id": 0, "content_hash": 1, "storage": 1, "file_id": 1}
+            )
+            async for blob in cursor:
+                blobs[blob["content_hash"]] = blob
+        for audio_meta in audio:
+            # Without a local copy the source's location is kept as-is
+            blob = blobs.get(audio_meta["content_hash"])
+            if blob is not None:
+                audio_meta["storage"] = blob.get("storage", "gridfs")
+                audio_meta["file_id"] = blob["file_id"]
+
+        skipped = await insert_unordered(db.audio_metadata, audio)
+        await adjust_blob_refs(
+            Counter(audio[index]["content_hash"] for index in skipped if audio[index]["content_hash"]),
+            -1
+        )
+        for index, audio_meta in enumerate(audio):
+            if index not in skipped:
+                search_index.add(audio_meta)
+        self.result.audio_imported += len(audio) - len(skipped)
+        self.result.audio_skipped += len(skipped)
+
+    async def _upsert_peaks(self, documents: List[dict]):
+        requests = []
+        for document in documents:
+            peaks = {
+                **document,
+                "levels": [
+                    {**level, "data": Binary(base64.b64decode(level["data"]))}
+                    for level in document["levels"]
+                ],
+                "created_date": datetime.fromisoformat(document["created_date"])
+                if document.get("created_date") else datetime.utcnow()
+            }
+            requests.append(UpdateOne(
+                {"content_hash": peaks["content_hash"]},
+                {"$setOnInsert": peaks},
+                upsert=True
+            ))
+        result = await db.audio_peaks.bulk_write(requests, ordered=False)
+        self.result.peaks_imported += result.upserted_count
+
+    async def add_blob(self, name: str, size: int, reader: ByteStreamReader):
+        kind, _, key = name.partition("/")
+        if kind == "blobs" and await db.audio_blobs.find_one({"content_hash": key}, {"_id": 1}):
+            await reader.skip(size)
+            self.result.blobs_existing += 1
+            return
+
+        await self._slots.acquire()
+        queue = asyncio.Queue(maxsize=IMPORT_QUEUE_PIECES)
+        task = asyncio.create_task(self._store_blob(kind, key, size, queue))
+        self._pending.add(task)
+        task.add_done_callback(lambda _: self._slots.release())
+        remaining = size
+        while remaining > 0:
+            piece = await reader.read(min(UPLOAD_READ_SIZE, remaining))
+            if not piece:
+                raise ValueError("Unexpected end of import stream")
+            remaining -= len(piece)
+            await queue.put(piece)
+        await queue.put(None)
+
+    async def _store_blob(self, kind: str, key: str, size: int, queue: asyncio.Queue):
+        ended = False  # Whether the end marker has been taken off the queue
+        try:
+            writer = default_storage.open_writer(key, "application/octet-stream")
+            hasher = hashlib.sha256()
+            try:
+                while (piece := await queue.get()) is not None:
+                    hasher.update(piece)
+                    await writer.write(piece)
+                ended = True
+                await writer.close()
+            except BaseException:
+                await writer.abort()
+                raise
+        except Exception:
+            # Keep consuming so the stream reader is never stuck on a full queue
+            while not ended and await queue.get() is not None:
+                pass
+            raise
+
+        content_hash = hasher.hexdigest()
+        if kind == "blobs" and content_hash != key:
+            await default_storage.delete(writer.file_id)
+            raise ValueError(f"Blob {key} does not match its content")
+        # Stored unreferenced; imported audio takes the references
+        blob = await register_blob(content_hash, default_storage.name, writer.file_id, size, references=0)
+        if blob["file_id"] != writer.file_id:
+            await default_storage.delete(writer.file_id)
+            self.result.blobs_existing += 1
+        else:
+            self._created.append(content_hash)
+            self.result.blobs_stored += 1
+        if kind == "files":
+            self._legacy_hashes[key] = content_hash
+
+    async def wait_for_blobs(self):
+        pending, self._pending = self._pending, set()
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def finish(self):
+        await self.wait_for_blobs()
+        for collection in self._handlers:
+            await self._flush(collection)
+        for start in range(0, len(self._playlist_ids), IMPORT_BATCH_SIZE):
+            await refresh_playlist_totals({"id": {"$in": self._playlist_ids[start:start + IMPORT_BATCH_SIZE]}})
+
+    async def close(self):
+        # Runs whether or not the import succeeded: blobs no imported audio
+        # ended up referencing are removed again
+        for task in self._pending:
+            task.cancel()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        for start in range(0, len(self._created), IMPORT_BATCH_SIZE):
+            cursor = db.audio_blobs.find({
+                "content_hash": {"$in": self._created[start:start + IMPORT_BATCH_SIZE]},
+                "ref_count": {"$lte": 0}
+            })
+            async for blob in cursor:
+                await drop_unreferenced_blob(blob)
+
+async def import_ndjson(importer: CatalogueImporter, reader: ByteStreamReader):
+    while line := await reader.readline():
+        await importer.add_line(line)
+
+async def import_tar(importer: CatalogueImporter, reader: ByteStreamReader):
+    while True:
+        header = await reader.readexactly(tarfile.BLOCKSIZE)
+        if not header.strip(b"\0"):
+            break  # End-of-archive marker
+        info = tarfile.TarInfo.frombuf(header, "utf-8", "surrogateescape")
+        if info.isreg() and info.name.startswith(("blobs/", "files/")):
+            await importer.add_blob(info.name, info.size, reader)
+        elif info.isreg() and info.name.startswith("catalogue/"):
+            # Audio is relinked to stored blobs, so those must be written first
+            await importer.wait_for_blobs()
+            for line in (await reader.readexactly(info.size)).splitlines():
+                await importer.add_line(line)
+        else:
+            await reader.skip(info.size)
+        await reader.skip(-info.size % tarfile.BLOCKSIZE)
+
+@api_router.get("/export")
+async def export_catalogue(format: str = Query("ndjson", pattern="^(ndjson|tar)$")):
+    """Stream the library catalogue; format=tar includes the audio bytes and peaks."""
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    if format == "tar":
+        body = iter_tar_export()
+        media_type = "application/x-tar"
+    else:
+        body = iter_ndjson_export(CATALOGUE_COLLECTIONS)
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="skiza-catalogue-{stamp}.{format}"'}
+    )
+
+@api_router.post("/import", response_model=ImportResult)
+async def import_catalogue(request: Request, format: str = Query("ndjson", pattern="^(ndjson|tar)$")):
+    """Load an /export stream sent as the raw request body.
+
+    Existing ids are skipped, so an interrupted import can simply be re-run.
+    """
+    importer = CatalogueImporter()
+    reader = ByteStreamReader(request.stream())
+    try:
+        try:
+            if format == "tar":
+                await import_tar(importer, reader)
+            else:
+                await import_ndjson(importer, reader)
+            await importer.finish()
+        finally:
+            await importer.close()
+        return importer.result
+    except (ValueError, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid import stream: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -229,8 +3768,12 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "X-Samples-Per-Peak", "X-Sample-Rate"],
 )
 
+# Outermost, so timings include every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -238,7 +3781,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes()
+
+@app.on_event("startup")
+async def backfill_playlist_totals():
+    # Playlists written before totals were tracked get them once
+    await refresh_playlist_totals({"track_count": {"$exists": False}})
+
+@app.on_event("startup")
+async def backfill_playlist_updated_date():
+    # Playlists written before updates were dated count as unchanged since creation
+    await db.playlists.update_many(
+        {"updated_date": {"$exists": False}},
+        [{"$set": {"updated_date": "$created_date"}}]
+    )
+
+@app.on_event("startup")
+async def start_job_queue():
+    global process_pool
+    if JOB_PROCESSES > 0:
+        # Motor and pymongo threads are already running, so workers must not be forked
+        process_pool = ProcessPoolExecutor(
+            max_workers=JOB_PROCESSES,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    await job_queue.start()
+
+@app.on_event("startup")
+async def start_play_tracker():
+    play_tracker.start()
+
+@app.on_event("startup")
+async def start_search_index():
+    global search_task
+    search_task = asyncio.create_task(search_index.run())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
-    sync_client.close()
\ No newline at end of file
+    await job_queue.stop()
+    if search_task is not None:
+        search_task.cancel()
+    await play_tracker.stop()
+    if process_pool is not None:
+        process_pool.shutdown(wait=False, cancel_futures=True)
+    client.close()
\ No newline at end of file
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Skiza Audio Player backend
+Runs the FastAPI app in-process and prints results as JSON
+
+Scenarios:
+  serialization   list-endpoint JSON encoding, model path vs fast path
+  upload          concurrent POST /api/upload-audio of unique WAV files
+  stream_full     whole-file GET /api/audio/{id}/stream
+  stream_range    single 64 KiB Range requests at random offsets
+  list_pages      GET /api/audio walked page by page via X-Next-Cursor
+  playlist_reads  GET /api/playlists/{id}/tracks
+
+The HTTP scenarios talk to a local MongoDB when --mongo-url is given and to
+an in-memory mongomock stand-in otherwise (pip install mongomock-motor).
+Each run uses a fresh database, seeded with --library-size tracks.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import struct
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+HTTP_SCENARIOS = ["upload", "stream_full", "stream_range", "list_pages", "playlist_reads"]
+ALL_SCENARIOS = ["serialization"] + HTTP_SCENARIOS
+RANGE_SIZE = 64 * 1024
+SEED_BLOBS = 8  # Distinct audio files shared by the seeded library
+gridfs_patches = None
+
+
+def load_server(mongo_url=None):
+    """Import backend/server.py against a fresh database"""
+    os.environ["DB_NAME"] = f"skiza_benchmark_{uuid.uuid4().hex[:8]}"
+    if mongo_url:
+        os.environ["MONGO_URL"] = mongo_url
+    else:
+        import mongomock_motor
+        import motor.motor_asyncio
+        from mongomock_motor import enabled_gridfs_integration
+
+        # Held for the whole run; the patches are undone once it is released
+        global gridfs_patches
+        gridfs_patches = enabled_gridfs_integration()
+        gridfs_patches.__enter__()
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+        os.environ["MONGO_URL"] = "mongodb://mongomock"
+    import server
+    return server
+
+
+def make_wav(size):
+    """16-bit mono 44.1 kHz PCM WAV of about `size` bytes, with random samples"""
+    data_size = max(size - 44, 2) // 2 * 2
+    header = b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+    header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, 44100, 88200, 2, 16)
+    header += b"data" + struct.pack("<I", data_size)
+    return header + os.urandom(data_size)
+
+
+def make_audio_documents(count):
+    """Build raw audio_metadata documents shaped like the ones Mongo returns"""
+    now = datetime.utcnow()
+    documents = []
+    for i in range(count):
+        documents.append({
+            "id": str(uuid.uuid4()),
+            "title": f"Track {i}",
+            "artist": f"Artist {i % 50}",
+            "duration": 180.0 + i % 120,
+            "file_size": 3_000_000 + i,
+            "mime_type": "audio/mpeg",
+            "upload_date": now - timedelta(seconds=i),
+            "file_id": uuid.uuid4().hex,
+            "storage": "gridfs",
+            "content_hash": uuid.uuid4().hex * 2,
+            "codec": "mp3",
+            "bitrate": 128000,
+            "sample_rate": 44100,
+            "channels": 2,
+            "is_podcast": i % 7 == 0,
+        })
+    return documents
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, bytes_received, elapsed):
+    ordered = sorted(latencies)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "throughput_bytes_per_s": round(bytes_received / elapsed) if elapsed else None,
+        "latency_ms": {
+            "mean": to_ms(sum(ordered) / len(ordered)) if ordered else None,
+            "p50": to_ms(percentile(ordered, 0.50)),
+            "p95": to_ms(percentile(ordered, 0.95)),
+            "p99": to_ms(percentile(ordered, 0.99)),
+            "max": to_ms(ordered[-1]) if ordered else None,
+        },
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+async def serialize_with_models(server, documents):
+    """Previous list path: model per row, response_model validation, stdlib JSON"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    items = [server.AudioMetadata(**document) for document in documents]
+    field = create_response_field(name="Response", type_=List[server.AudioMetadata])
+    content = await serialize_response(field=field, response_content=items)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False,
+                      allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+async def serialize_fast_path(server, documents):
+    """Current list path: defaults top-up and orjson"""
+    import orjson
+    return orjson.dumps(server.fill_defaults(documents, server.AUDIO_DEFAULTS))
+
+
+async def time_call(func, server, documents, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func(server, documents)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+async def benchmark_serialization(server, items, repeat):
+    documents = make_audio_documents(items)
+    models = await time_call(serialize_with_models, server, documents, repeat)
+    fast = await time_call(serialize_fast_path, server, documents, repeat)
+    per_10k = 10_000 / items
+    return {
+        "items": items,
+        "repeat": repeat,
+        "model_path_ms_per_10k": round(models * per_10k * 1000, 2),
+        "fast_path_ms_per_10k": round(fast * per_10k * 1000, 2),
+        "speedup": round(models / fast, 2) if fast else None,
+    }
+
+
+class LoadRunner:
+    """Drives the in-process app with an async HTTP client"""
+
+    def __init__(self, server, client, args):
+        self.server = server
+        self.client = client
+        self.args = args
+        self.audio = []  # (id, file_size) of every seeded track
+        self.playlist_ids = []
+
+    async def seed(self):
+        """Store a few real files, then fan them out to --library-size tracks"""
+        server = self.server
+        blobs = []
+        for i in range(min(SEED_BLOBS, self.args.library_size)):
+            response = await self.client.post(
+                "/api/upload-audio",
+                files={"file": (f"seed-{i}.wav", make_wav(self.args.audio_kb * 1024), "audio/wav")},
+                data={"title": f"Seed {i}", "artist": "Benchmark"},
+            )
+            response.raise_for_status()
+            blobs.append(response.json())
+            self.audio.append((blobs[-1]["id"], blobs[-1]["file_size"]))
+
+        now = datetime.utcnow()
+        batch = []
+        for i in range(len(blobs), self.args.library_size):
+            blob = blobs[i % len(blobs)]
+            audio = server.AudioMetadata(**{
+                **blob,
+                "id": str(uuid.uuid4()),
+                "title": f"Track {i}",
+                "artist": f"Artist {i % 50}",
+                "upload_date": now - timedelta(seconds=i),
+                "processing": "done",
+            })
+            batch.append(audio.dict())
+            self.audio.append((audio.id, audio.file_size))
+            if len(batch) == 1000:
+                await self._insert_tracks(batch)
+                batch = []
+        if batch:
+            await self._insert_tracks(batch)
+
+        for i in range(self.args.playlists):
+            tracks = random.sample(self.audio, min(self.args.playlist_size, len(self.audio)))
+            playlist = server.PlaylistItem(title=f"Playlist {i}", audio_items=[audio_id for audio_id, _ in tracks])
+            await server.db.playlists.insert_one(playlist.dict())
+            self.playlist_ids.append(playlist.id)
+
+    async def _insert_tracks(self, documents):
+        # Seeded tracks share the uploaded blobs, as deduplicated uploads would
+        counts = {}
+        for document in documents:
+            counts[document["content_hash"]] = counts.get(document["content_hash"], 0) + 1
+        await self.server.db.audio_metadata.insert_many(documents)
+        for content_hash, count in counts.items():
+            await self.server.db.audio_blobs.update_one(
+                {"content_hash": content_hash}, {"$inc": {"ref_count": count}}
+            )
+
+    async def drive(self, requests):
+        """Run request factories with --concurrency workers; each returns bytes received"""
+        pending = iter(requests)
+        latencies = []
+        errors = 0
+        received = 0
+
+        async def worker():
+            nonlocal errors, received
+            for make_request in pending:
+                started = time.perf_counter()
+                try:
+                    # Awaited first: `received += await ...` reads received before suspending
+                    size = await make_request()
+                except Exception:
+                    errors += 1
+                    continue
+                received += size
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return summarize(latencies, errors, received, time.perf_counter() - started)
+
+    async def get(self, url, headers=None, expect=200):
+        response = await self.client.get(url, headers=headers)
+        if response.status_code != expect:
+            raise RuntimeError(f"GET {url}: {response.status_code}")
+        return response
+
+    def upload_requests(self):
+        async def upload():
+            body = make_wav(self.args.audio_kb * 1024)
+            response = await self.client.post(
+                "/api/upload-audio",
+                files={"file": ("load.wav", body, "audio/wav")},
+                data={"title": "Load test", "artist": "Benchmark"},
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"upload: {response.status_code}")
+            return len(response.content)
+        return [upload for _ in range(self.args.requests)]
+
+    def stream_full_requests(self):
+        async def stream():
+            audio_id, _ = random.choice(self.audio)
+            return len((await self.get(f"/api/audio/{audio_id}/stream")).content)
+        return [stream for _ in range(self.args.requests)]
+
+    def stream_range_requests(self):
+        async def stream_range():
+            audio_id, file_size = random.choice(self.audio)
+            start = random.randrange(0, max(file_size - RANGE_SIZE, 1))
+            headers = {"Range": f"bytes={start}-{start + RANGE_SIZE - 1}"}
+            return len((await self.get(f"/api/audio/{audio_id}/stream", headers, expect=206)).content)
+        return [stream_range for _ in range(self.args.requests)]
+
+    def list_page_requests(self):
+        # One shared walk; each page fetch is a sample, restarting at the end
+        state = {"cursor": None}
+
+        async def next_page():
+            url = f"/api/audio?limit={self.args.page_size}"
+            if state["cursor"]:
+                url += f"&after={state['cursor']}"
+            response = await self.get(url)
+            state["cursor"] = response.headers.get("X-Next-Cursor")
+            return len(response.content)
+        return [next_page for _ in range(self.args.requests)]
+
+    def playlist_read_requests(self):
+        async def read_playlist():
+            playlist_id = random.choice(self.playlist_ids)
+            return len((await self.get(f"/api/playlists/{playlist_id}/tracks?limit=50")).content)
+        return [read_playlist for _ in range(self.args.requests)] if self.playlist_ids else []
+
+    async def run(self, scenario):
+        factories = {
+            "upload": self.upload_requests,
+            "stream_full": self.stream_full_requests,
+            "stream_range": self.stream_range_requests,
+            "list_pages": self.list_page_requests,
+            "playlist_reads": self.playlist_read_requests,
+        }
+        return await self.drive(factories[scenario]())
+
+
+async def run_http_scenarios(server, args, scenarios):
+    import httpx
+
+    for handler in server.app.router.on_startup:
+        await handler()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            runner = LoadRunner(server, client, args)
+            started = time.perf_counter()
+            await runner.seed()
+            results = {"seed": {"tracks": len(runner.audio), "elapsed_s": round(time.perf_counter() - started, 3)}}
+            for scenario in scenarios:
+                results[scenario] = await runner.run(scenario)
+            return results
+    finally:
+        await server.client.drop_database(os.environ["DB_NAME"])
+        for handler in server.app.router.on_shutdown:
+            await handler()
+
+
+async def run_benchmarks(args):
+    # Imported inside the loop, so the stand-in's GridFS binds to this loop
+    server = load_server(args.mongo_url)
+    results = {}
+    if "serialization" in args.scenarios:
+        results["serialization"] = await benchmark_serialization(server, args.items, args.repeat)
+    http_scenarios = [scenario for scenario in args.scenarios if scenario in HTTP_SCENARIOS]
+    if http_scenarios:
+        results.update(await run_http_scenarios(server, args, http_scenarios))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skiza backend benchmarks")
+    parser.add_argument("--scenarios", nargs="+", choices=ALL_SCENARIOS, default=ALL_SCENARIOS)
+    parser.add_argument("--mongo-url", help="Local MongoDB to use instead of the in-memory stand-in")
+    parser.add_argument("--library-size", type=int, default=1000, help="Tracks seeded before the run")
+    parser.add_argument("--playlists", type=int, default=20)
+    parser.add_argument("--playlist-size", type=int, default=100)
+    parser.add_argument("--audio-kb", type=int, default=512, help="Size of each generated WAV")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--items", type=int, default=10_000, help="Documents for the serialization benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for request mixes")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": sys.version.split()[0],
+        "mongo": "mongodb" if args.mongo_url else "mongomock",
+        "config": {key: value for key, value in vars(args).items() if key not in ("mongo_url", "output")},
+        "results": asyncio.run(run_benchmarks(args)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
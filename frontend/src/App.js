@@ -198,28 +198,37 @@ const FileUpload = ({ onUploadSuccess }) => {
 
   const uploadFiles = async (files) => {
     setUploading(true);
-    
+
+    const formData = new FormData();
+    const audioFiles = [];
     for (const file of files) {
       if (!file.type.startsWith('audio/')) {
         alert(`${file.name} is not an audio file`);
         continue;
       }
+      audioFiles.push(file);
+      formData.append('files', file);
+      formData.append('titles', file.name.replace(/\.[^/.]+$/, ""));
+    }
+    formData.append('artist', 'Unknown Artist');
+    formData.append('is_podcast', false);
 
-      const formData = new FormData();
-      formData.append('file', file);
-      formData.append('title', file.name.replace(/\.[^/.]+$/, ""));
-      formData.append('artist', 'Unknown Artist');
-      formData.append('is_podcast', false);
-
+    if (audioFiles.length > 0) {
       try {
-        await axios.post(`${API}/upload-audio`, formData, {
+        const response = await axios.post(`${API}/upload-audio/bulk`, formData, {
           headers: {
             'Content-Type': 'multipart/form-data',
           },
         });
+        for (const result of response.data) {
+          if (!result.success) {
+            console.error('Upload failed:', result.error);
+            alert(`Failed to upload ${result.filename}`);
+          }
+        }
       } catch (error) {
         console.error('Upload failed:', error);
-        alert(`Failed to upload ${file.name}`);
+        alert('Failed to upload files');
       }
     }
     
@@ -265,7 +274,7 @@ const FileUpload = ({ onUploadSuccess }) => {
 };
 
 // Track List Component
-const TrackList = ({ audioFiles, currentTrack, onTrackSelect, onDeleteTrack }) => {
+const TrackList = ({ audioFiles, currentTrack, onTrackSelect, onDeleteTrack, hasMore, onLoadMore }) => {
   return (
     <div className="track-list">
       <h3>Your Music Library</h3>
@@ -299,6 +308,11 @@ const TrackList = ({ audioFiles, currentTrack, onTrackSelect, onDeleteTrack }) =
           ))}
         </div>
       )}
+      {hasMore && (
+        <button className="load-more-btn" onClick={onLoadMore}>
+          Load more
+        </button>
+      )}
     </div>
   );
 };
@@ -308,13 +322,18 @@ function App() {
   const [audioFiles, setAudioFiles] = useState([]);
   const [currentTrack, setCurrentTrack] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  const fetchAudioFiles = async () => {
+  const fetchAudioFiles = async (after = null) => {
     try {
-      const response = await axios.get(`${API}/audio`);
-      setAudioFiles(response.data);
-      if (response.data.length > 0 && !currentTrack) {
-        setCurrentTrack(response.data[0]);
+      const response = await axios.get(`${API}/audio`, {
+        params: after ? { after } : {},
+      });
+      const files = after ? [...audioFiles, ...response.data] : response.data;
+      setAudioFiles(files);
+      setNextCursor(response.headers['x-next-cursor'] || null);
+      if (files.length > 0 && !currentTrack) {
+        setCurrentTrack(files[0]);
       }
     } catch (error) {
       console.error('Failed to fetch audio files:', error);
@@ -357,7 +376,7 @@ function App() {
         </header>
 
         <main className="main-content">
-          <FileUpload onUploadSuccess={fetchAudioFiles} />
+          <FileUpload onUploadSuccess={() => fetchAudioFiles()} />
           
           <div className="player-section">
             <AudioPlayer
@@ -372,6 +391,8 @@ function App() {
             currentTrack={currentTrack}
             onTrackSelect={setCurrentTrack}
             onDeleteTrack={handleDeleteTrack}
+            hasMore={Boolean(nextCursor)}
+            onLoadMore={() => fetchAudioFiles(nextCursor)}
           />
         </main>
       </div>
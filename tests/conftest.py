@@ -0,0 +1,38 @@
+import os
+import sys
+from pathlib import Path
+
+import mongomock_motor
+import motor.motor_asyncio
+import pytest
+from mongomock_motor import enabled_gridfs_integration
+
+# server.py connects at import time; every test runs against mongomock, with
+# GridFS patched for the whole session
+os.environ["MONGO_URL"] = "mongodb://mongomock"
+os.environ["DB_NAME"] = "test_database"
+gridfs_patches = enabled_gridfs_integration()
+gridfs_patches.__enter__()
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def api():
+    """An HTTP client for the app over an empty database."""
+    import httpx
+    import server
+
+    for name in await server.db.list_collection_names():
+        await server.db.drop_collection(name)
+    # Motor buckets keep the event loop they were built on; each test gets its own
+    server.storage_backends["gridfs"].bucket = server.AsyncIOMotorGridFSBucket(server.db)
+    server.search_index = server.SearchIndex()
+    server.search_index.ready.set()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        yield client
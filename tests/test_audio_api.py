@@ -0,0 +1,111 @@
+import asyncio
+import struct
+
+import orjson
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def make_wav(seconds: float = 0.5, sample_rate: int = 8000) -> bytes:
+    data = bytes(range(256)) * int(seconds * sample_rate * 2 / 256)
+    header = b"RIFF" + struct.pack("<I", 36 + len(data)) + b"WAVE"
+    header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    return header + b"data" + struct.pack("<I", len(data)) + data
+
+
+async def upload(api, data: bytes, title: str) -> dict:
+    response = await api.post(
+        "/api/upload-audio",
+        files={"file": ("track.wav", data, "audio/wav")},
+        data={"title": title}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def blob_refs(content_hash: str):
+    blob = await server.db.audio_blobs.find_one({"content_hash": content_hash})
+    return blob["ref_count"] if blob else None
+
+
+@pytest.fixture
+def slow_release(monkeypatch):
+    # Stands in for the Mongo round trips that let concurrent deletes interleave
+    release_blob = server.release_blob
+
+    async def delayed(audio_meta):
+        await asyncio.sleep(0.05)
+        await release_blob(audio_meta)
+
+    monkeypatch.setattr(server, "release_blob", delayed)
+
+
+async def test_identical_uploads_share_one_blob(api):
+    data = make_wav()
+    first = await upload(api, data, "A")
+    second = await upload(api, data, "B")
+    assert first["file_id"] == second["file_id"]
+    assert await blob_refs(first["content_hash"]) == 2
+
+    assert (await api.delete(f"/api/audio/{first['id']}")).status_code == 200
+    assert await blob_refs(first["content_hash"]) == 1
+    response = await api.get(f"/api/audio/{second['id']}/stream")
+    assert response.status_code == 200
+    assert response.content == data
+
+    assert (await api.delete(f"/api/audio/{second['id']}")).status_code == 200
+    assert await blob_refs(first["content_hash"]) is None
+    assert await server.db["fs.files"].count_documents({}) == 0
+
+
+async def test_concurrent_deletes_release_the_blob_once(api, slow_release):
+    data = make_wav()
+    first = await upload(api, data, "A")
+    second = await upload(api, data, "B")
+
+    responses = await asyncio.gather(*(api.delete(f"/api/audio/{first['id']}") for _ in range(2)))
+    assert sorted(response.status_code for response in responses) == [200, 404]
+    assert await blob_refs(first["content_hash"]) == 1
+
+    response = await api.get(f"/api/audio/{second['id']}/stream")
+    assert response.status_code == 200
+    assert response.content == data
+
+
+async def test_bulk_delete_overlapping_single_delete(api, slow_release):
+    data = make_wav()
+    first = await upload(api, data, "A")
+    second = await upload(api, data, "B")
+
+    bulk, single = await asyncio.gather(
+        api.post("/api/audio/bulk-delete", json={"ids": [first["id"], "missing"]}),
+        api.delete(f"/api/audio/{first['id']}")
+    )
+    result = bulk.json()
+    # Exactly one of the two requests deleted the track
+    assert (result["deleted"] == [first["id"]]) != (single.status_code == 200)
+    assert "missing" in result["not_found"]
+    assert await blob_refs(first["content_hash"]) == 1
+    assert (await api.get(f"/api/audio/{second['id']}/stream")).content == data
+
+
+async def test_delete_audio_imported_without_its_bytes(api):
+    # An NDJSON import carries the source database's file id, which was never stored here
+    document = {
+        "id": "imported",
+        "title": "Imported",
+        "file_size": 1000,
+        "mime_type": "audio/mpeg",
+        "file_id": "65f0c0ffee0000000000abcd",
+    }
+    body = orjson.dumps({"collection": "audio_metadata", "document": document}) + b"\n"
+    response = await api.post("/api/import", content=body)
+    assert response.status_code == 200, response.text
+    assert response.json()["audio_imported"] == 1
+
+    assert (await api.delete("/api/audio/imported")).status_code == 200
+    assert (await api.get("/api/audio/imported")).status_code == 404
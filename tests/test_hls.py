@@ -0,0 +1,88 @@
+import struct
+
+import pytest
+
+from server import HlsSegmenter, hls_timestamp_tag, id3v2_size, scan_mp3_frames
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz: 417-byte frames of 1152 samples
+MP3_HEADER = b"\xff\xfb\x90\x40"
+FRAME_SECONDS = 1152 / 44100
+
+
+def frame(marker: int) -> bytes:
+    return MP3_HEADER + bytes([marker]) * 413
+
+
+def xing_frame() -> bytes:
+    body = b"\x00" * 32 + b"Xing" + struct.pack(">III", 0x03, 100, 41700)
+    return MP3_HEADER + body + b"\x00" * (413 - len(body))
+
+
+def segment(data: bytes, segment_seconds: float, piece_size: int):
+    segmenter = HlsSegmenter(segment_seconds)
+    segments = []
+    for offset in range(0, len(data), piece_size):
+        taken = segmenter.take(data[offset:offset + piece_size])
+        if taken:
+            segments.extend(segmenter.add(taken))
+    return segments + segmenter.finish()
+
+
+def frames_of(body: bytes) -> bytes:
+    # Segment bodies are a timestamp ID3 tag followed by whole frames
+    return body[id3v2_size(body):]
+
+
+def test_timestamp_tag():
+    tag = hls_timestamp_tag(2.5)
+    assert tag[:3] == b"ID3"
+    assert id3v2_size(tag) == len(tag)
+    assert b"com.apple.streaming.transportStreamTimestamp" in tag
+    assert struct.unpack(">Q", tag[-8:])[0] == 225000
+
+
+def test_scan_leaves_incomplete_frame():
+    data = frame(1) * 3 + frame(2)[:100]
+    frames, consumed = scan_mp3_frames(data)
+    assert [offset for offset, _ in frames] == [0, 417, 834]
+    assert consumed == 3 * 417
+
+
+def test_scan_skips_garbage_between_frames():
+    frames, consumed = scan_mp3_frames(b"junk" + frame(1) + frame(2))
+    assert [offset for offset, _ in frames] == [4, 421]
+    assert consumed == 4 + 2 * 417
+
+
+@pytest.mark.parametrize("piece_size", [1, 100, 417, 5000, 1 << 20])
+def test_segments_cover_every_frame_once(piece_size):
+    frames = [frame(n % 250 + 1) for n in range(500)]
+    segments = segment(b"".join(frames), 2.0, piece_size)
+
+    assert b"".join(frames_of(body) for _, _, body in segments) == b"".join(frames)
+    # Every segment but the last reaches the target length, by whole frames
+    for _, duration, _ in segments[:-1]:
+        assert 2.0 <= duration < 2.0 + FRAME_SECONDS
+    assert sum(duration for _, duration, _ in segments) == pytest.approx(500 * FRAME_SECONDS)
+
+
+def test_segment_starts_follow_durations():
+    segments = segment(frame(1) * 400, 3.0, 4096)
+    start = 0.0
+    for segment_start, duration, body in segments:
+        assert segment_start == pytest.approx(start)
+        assert struct.unpack(">Q", body[id3v2_size(body) - 8:id3v2_size(body)])[0] == round(start * 90000)
+        start += duration
+
+
+def test_leading_id3_tag_and_info_frame_are_dropped():
+    tag = b"ID3\x03\x00\x00\x00\x00\x02\x00" + b"\x00" * 256
+    audio = frame(7) * 10
+    segments = segment(tag + xing_frame() + audio, 60.0, 50)
+    assert len(segments) == 1
+    assert frames_of(segments[0][2]) == audio
+    assert segments[0][1] == pytest.approx(10 * FRAME_SECONDS)
+
+
+def test_no_frames_no_segments():
+    assert segment(b"\x00" * 10000, 2.0, 1000) == []
@@ -0,0 +1,93 @@
+import pytest
+
+import server
+from server import AudioMetadata, splice_tracks, track_totals
+
+
+def evaluate(expression, audio_items: list):
+    """The subset of MongoDB's expression language splice_tracks emits."""
+    if expression == "$audio_items":
+        return list(audio_items)
+    if isinstance(expression, list):
+        return expression
+    (operator, argument), = expression.items()
+    if operator == "$literal":
+        return argument
+    if operator == "$concatArrays":
+        return [item for part in argument for item in evaluate(part, audio_items)]
+    if operator == "$slice":
+        array = evaluate(argument[0], audio_items)
+        if len(argument) == 2:
+            count = argument[1]
+            return array[:count] if count >= 0 else array[count:]
+        position, count = argument[1], argument[2]
+        assert position >= 0 and count > 0  # MongoDB rejects anything else
+        return array[position:position + count]
+    raise AssertionError(f"unexpected operator {operator}")
+
+
+ITEMS = ["a", "b", "c", "d", "e"]
+
+
+@pytest.mark.parametrize("position", range(len(ITEMS)))
+def test_remove_at_position(position):
+    expected = ITEMS[:position] + ITEMS[position + 1:]
+    assert evaluate(splice_tracks(position, remove=1), ITEMS) == expected
+
+
+@pytest.mark.parametrize("position", range(len(ITEMS) + 1))
+def test_insert_at_position(position):
+    expected = ITEMS[:position] + ["x", "y"] + ITEMS[position:]
+    assert evaluate(splice_tracks(position, insert=["x", "y"]), ITEMS) == expected
+
+
+@pytest.mark.parametrize("source,target", [(0, 4), (4, 0), (1, 3), (3, 1), (2, 2)])
+def test_move_is_remove_then_insert(source, target):
+    # move_playlist_track runs these two $set stages in order
+    audio_id = ITEMS[source]
+    removed = evaluate(splice_tracks(source, remove=1), ITEMS)
+    moved = evaluate(splice_tracks(target, insert=[audio_id]), removed)
+    expected = [item for item in ITEMS if item != audio_id]
+    expected.insert(target, audio_id)
+    assert moved == expected
+    assert moved[target] == audio_id
+
+
+def test_inserted_ids_are_literals():
+    # An id starting with "$" must not be read as a field path
+    expression = splice_tracks(0, insert=["$audio_items"])
+    assert {"$literal": ["$audio_items"]} in expression["$concatArrays"]
+
+
+def test_track_totals_count_missing_audio_without_duration():
+    audio_metas = {
+        "a": {"duration": 10.5, "file_size": 1000},
+        "b": {"duration": None, "file_size": 500},
+    }
+    assert track_totals(["a", "b", "a", "gone"], audio_metas) == {
+        "track_count": 4,
+        "total_duration": 21.0,
+        "total_bytes": 2500,
+    }
+
+
+@pytest.mark.anyio
+async def test_playlist_reads_are_conditional(api):
+    audio = AudioMetadata(id="song", title="Song", file_size=1000, mime_type="audio/mpeg", file_id="f")
+    await server.db.audio_metadata.insert_one(audio.dict())
+    playlist = (await api.post("/api/playlists", json={"title": "Mix"})).json()
+
+    assert (await api.get("/api/playlists/missing")).status_code == 404
+    for path in (f"/api/playlists/{playlist['id']}", "/api/playlists", "/api/playlists/summaries"):
+        response = await api.get(path)
+        assert response.status_code == 200
+        assert response.headers["Last-Modified"]
+        etag = response.headers["ETag"]
+        assert (await api.get(path, headers={"If-None-Match": etag})).status_code == 304
+        since = {"If-Modified-Since": response.headers["Last-Modified"]}
+        assert (await api.get(path, headers=since)).status_code == 304
+
+        await api.post(f"/api/playlists/{playlist['id']}/tracks", json={"audio_ids": ["song"]})
+        changed = await api.get(path, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
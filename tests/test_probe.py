@@ -0,0 +1,148 @@
+import io
+import struct
+import wave
+
+import pytest
+
+from server import PROBE_HEAD_SIZE, AudioProbe, detect_container, parse_mp3_frame_header
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, joint stereo: 417-byte frames
+MP3_HEADER = b"\xff\xfb\x90\x40"
+MP3_FRAME = MP3_HEADER + b"\x00" * 413
+
+
+def probe(data: bytes, piece_size: int = None):
+    audio_probe = AudioProbe()
+    piece_size = piece_size or len(data)
+    for offset in range(0, len(data), piece_size):
+        audio_probe.feed(data[offset:offset + piece_size])
+    return audio_probe.result()
+
+
+def make_wav(seconds: float = 2.0, sample_rate: int = 8000, channels: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(b"\x00\x00" * channels * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
+def id3_tag(body_size: int) -> bytes:
+    size = bytes(((body_size >> 21) & 0x7F, (body_size >> 14) & 0x7F, (body_size >> 7) & 0x7F, body_size & 0x7F))
+    return b"ID3\x03\x00\x00" + size + b"\x00" * body_size
+
+
+def xing_frame(frames: int, size: int) -> bytes:
+    # Stereo MPEG-1: 32 bytes of side info before the Xing header
+    body = b"\x00" * 32 + b"Xing" + struct.pack(">III", 0x03, frames, size)
+    return MP3_HEADER + body + b"\x00" * (413 - len(body))
+
+
+def make_flac(sample_rate: int = 44100, channels: int = 2, bits: int = 16, samples: int = 441000) -> bytes:
+    info = (sample_rate << 44) | ((channels - 1) << 41) | ((bits - 1) << 36) | samples
+    streaminfo = b"\x00" * 10 + info.to_bytes(8, "big") + b"\x00" * 16
+    return b"fLaC" + b"\x80" + len(streaminfo).to_bytes(3, "big") + streaminfo + b"\x00" * 1000
+
+
+def ogg_page(packet: bytes, granule: int) -> bytes:
+    return b"OggS\x00\x00" + struct.pack("<q", granule) + b"\x00" * 12 + bytes([1, len(packet)]) + packet
+
+
+def test_detect_container():
+    assert detect_container(make_wav()[:12]) == "wav"
+    assert detect_container(MP3_FRAME[:12]) == "mp3"
+    assert detect_container(id3_tag(10)[:12]) == "mp3"
+    assert detect_container(b"OggS" + b"\x00" * 8) == "ogg"
+    assert detect_container(b"\x00\x00\x00\x20ftypM4A ") == "mp4"
+    assert detect_container(b"fLaC" + b"\x00" * 8) == "flac"
+    assert detect_container(b"\x00" * 12) is None
+
+
+def test_adts_aac_is_not_mp3():
+    adts = b"\xff\xf1\x50\x80\x02\x1f\xfc" + b"\x00" * 5
+    assert detect_container(adts) is None
+    assert parse_mp3_frame_header(adts[:4]) is None
+
+
+def test_parse_mp3_frame_header():
+    frame = parse_mp3_frame_header(MP3_HEADER)
+    assert frame["version"] == 1
+    assert frame["layer"] == 3
+    assert frame["bitrate"] == 128000
+    assert frame["sample_rate"] == 44100
+    assert frame["channels"] == 2
+    assert frame["frame_length"] == 417
+    assert parse_mp3_frame_header(b"\xff\xfb\xf0\x40") is None  # Bitrate index 15
+
+
+def test_wav():
+    result = probe(make_wav(seconds=2.0, sample_rate=8000))
+    assert result.container == "wav"
+    assert result.codec == "pcm_s16le"
+    assert result.mime_type == "audio/wav"
+    assert result.sample_rate == 8000
+    assert result.channels == 1
+    assert result.data_offset == 44
+    assert result.duration == pytest.approx(2.0)
+
+
+def test_cbr_mp3_duration_from_bitrate():
+    data = MP3_FRAME * 100
+    result = probe(data)
+    assert result.container == "mp3"
+    assert result.codec == "mp3"
+    assert result.mime_type == "audio/mpeg"
+    assert result.bitrate == 128000
+    assert result.duration == pytest.approx(len(data) * 8 / 128000)
+
+
+def test_vbr_mp3_duration_from_xing_header():
+    data = xing_frame(frames=1000, size=400000) + MP3_FRAME * 20
+    result = probe(data)
+    assert result.duration == pytest.approx(1000 * 1152 / 44100)
+    assert result.bitrate == int(400000 * 8 / result.duration)
+
+
+def test_mp3_after_id3_tag_larger_than_head_window():
+    result = probe(id3_tag(PROBE_HEAD_SIZE * 2) + MP3_FRAME * 50, piece_size=4096)
+    assert result.container == "mp3"
+    assert result.duration == pytest.approx(50 * 417 * 8 / 128000)
+
+
+def test_id3_tag_without_frames_claims_nothing():
+    result = probe(id3_tag(100) + b"not audio" * 100)
+    assert result.container is None
+    assert result.mime_type is None
+
+
+def test_flac():
+    result = probe(make_flac(sample_rate=44100, channels=2, bits=16, samples=441000))
+    assert result.codec == "flac"
+    assert result.sample_rate == 44100
+    assert result.channels == 2
+    assert result.bits_per_sample == 16
+    assert result.duration == pytest.approx(10.0)
+
+
+def test_opus_duration_from_last_granule():
+    head = b"OpusHead\x01\x02" + struct.pack("<HI", 312, 48000) + b"\x00\x00\x00"
+    data = ogg_page(head, 0) + b"\x00" * 5000 + ogg_page(b"\x00" * 10, 48000 * 3 + 312)
+    result = probe(data)
+    assert result.codec == "opus"
+    assert result.channels == 2
+    assert result.duration == pytest.approx(3.0)
+
+
+@pytest.mark.parametrize("make", [
+    lambda: make_wav(),
+    lambda: MP3_FRAME * 100,
+    lambda: id3_tag(PROBE_HEAD_SIZE + 100) + MP3_FRAME * 30,
+    lambda: make_flac(),
+])
+@pytest.mark.parametrize("piece_size", [1, 7, 1000, 65537])
+def test_feed_is_independent_of_piece_boundaries(make, piece_size):
+    data = make()
+    assert probe(data, piece_size) == probe(data)
+    assert probe(data, piece_size).duration is not None
@@ -0,0 +1,53 @@
+import pytest
+from fastapi import HTTPException
+
+from server import MAX_BYTE_RANGES, parse_range_header
+
+
+def test_missing_or_foreign_header_serves_full_body():
+    assert parse_range_header(None, 1000) is None
+    assert parse_range_header("", 1000) is None
+    assert parse_range_header("items=0-10", 1000) is None
+    assert parse_range_header("bytes=", 1000) is None
+
+
+def test_single_ranges():
+    assert parse_range_header("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range_header("bytes=500-", 1000) == [(500, 999)]
+    assert parse_range_header("BYTES = 10-19", 1000) == [(10, 19)]
+
+
+def test_end_is_clamped_to_file_size():
+    assert parse_range_header("bytes=900-5000", 1000) == [(900, 999)]
+
+
+def test_suffix_ranges():
+    assert parse_range_header("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=-5000", 1000) == [(0, 999)]
+
+
+def test_malformed_ranges_are_ignored():
+    assert parse_range_header("bytes=abc-def", 1000) is None
+    assert parse_range_header("bytes=50", 1000) is None
+    assert parse_range_header("bytes=100-50", 1000) is None
+
+
+def test_overlapping_and_adjacent_ranges_are_coalesced():
+    assert parse_range_header("bytes=0-9,5-19,20-29", 1000) == [(0, 29)]
+    assert parse_range_header("bytes=50-59,0-9", 1000) == [(0, 9), (50, 59)]
+
+
+def test_unsatisfiable_ranges_are_dropped():
+    assert parse_range_header("bytes=0-9,2000-3000", 1000) == [(0, 9)]
+
+
+def test_nothing_satisfiable_raises_416():
+    with pytest.raises(HTTPException) as excinfo:
+        parse_range_header("bytes=1000-", 1000)
+    assert excinfo.value.status_code == 416
+    assert excinfo.value.headers["Content-Range"] == "bytes */1000"
+
+
+def test_too_many_ranges_serves_full_body():
+    spec = ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(MAX_BYTE_RANGES + 1))
+    assert parse_range_header(f"bytes={spec}", 100000) is None
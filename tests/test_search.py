@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+from server import SearchIndex, normalize_text, tokenize
+
+NOW = datetime(2024, 1, 1)
+
+
+def track(audio_id: str, title: str, artist: str = None, age_days: int = 0, is_podcast: bool = False) -> dict:
+    return {
+        "id": audio_id,
+        "title": title,
+        "artist": artist,
+        "upload_date": NOW - timedelta(days=age_days),
+        "is_podcast": is_podcast,
+    }
+
+
+@pytest.fixture
+def index():
+    search_index = SearchIndex()
+    for document in [
+        track("beyonce", "Beyoncé Live", "Queen B", age_days=0),
+        track("oasis", "Live Forever", "Oasis", age_days=1),
+        track("rhapsody", "Bohemian Rhapsody", "Queen", age_days=2, is_podcast=True),
+        track("queen", "Queen", "Someone", age_days=3),
+        track("other", "Something Else", "Nobody", age_days=4),
+    ]:
+        search_index.add(document)
+    return search_index
+
+
+def ids(result):
+    return result[0]
+
+
+def test_normalize_and_tokenize():
+    assert normalize_text("Beyoncé") == "beyonce"
+    assert normalize_text(None) == ""
+    assert tokenize("Don't Stop  Me-Now") == ["don", "t", "stop", "me", "now"]
+
+
+def test_exact_title_outranks_artist_matches(index):
+    # The track titled "Queen" wins; the two artist matches tie, newest first
+    assert ids(index.search("queen", 0, 10)) == ["queen", "beyonce", "rhapsody"]
+
+
+def test_title_starting_with_the_query_ranks_first(index):
+    assert ids(index.search("live", 0, 10)) == ["oasis", "beyonce"]
+    assert ids(index.search("live forever", 0, 10)) == ["oasis"]
+
+
+def test_last_word_matches_as_prefix(index):
+    assert ids(index.search("bohem", 0, 10)) == ["rhapsody"]
+    assert ids(index.search("so", 0, 10)) == ["other", "queen"]
+
+
+def test_every_word_must_match(index):
+    assert index.search("queen forever", 0, 10) == ([], 0)
+    assert index.search("", 0, 10) == ([], 0)
+
+
+def test_accents_and_case_are_ignored(index):
+    assert ids(index.search("BEYONCE", 0, 10)) == ["beyonce"]
+    assert ids(index.search("beyoncé", 0, 10)) == ["beyonce"]
+
+
+def test_ties_rank_newest_first():
+    search_index = SearchIndex()
+    for age in (3, 1, 2):
+        search_index.add(track(f"t{age}", "Same Title", age_days=age))
+    assert ids(search_index.search("same", 0, 10)) == ["t1", "t2", "t3"]
+
+
+def test_paging_and_total(index):
+    assert index.search("queen", 0, 2) == (["queen", "beyonce"], 3)
+    assert index.search("queen", 2, 2) == (["rhapsody"], 3)
+
+
+def test_podcast_filter(index):
+    assert ids(index.search("queen", 0, 10, is_podcast=True)) == ["rhapsody"]
+    assert ids(index.search("queen", 0, 10, is_podcast=False)) == ["queen", "beyonce"]
+
+
+def test_remove_and_readd(index):
+    index.remove("queen")
+    assert ids(index.search("queen", 0, 10)) == ["beyonce", "rhapsody"]
+    index.add(track("oasis", "Champagne Supernova", "Oasis", age_days=1))
+    assert ids(index.search("live", 0, 10)) == ["beyonce"]
+    assert ids(index.search("champ", 0, 10)) == ["oasis"]
+    assert len(index) == 4
+
+
+def test_bulk_load_matches_incremental_adds():
+    documents = [track(str(n), f"Song {n} mix", f"Artist {n % 7}", age_days=n) for n in range(200)]
+    incremental = SearchIndex()
+    bulk = SearchIndex()
+    bulk._sorted = False
+    for document in documents:
+        incremental.add(document)
+        bulk.add(document)
+    bulk.finish_bulk_load()
+    for query in ("song", "artist 3", "mix", "song 1", "art"):
+        assert bulk.search(query, 0, 50) == incremental.search(query, 0, 50)
+
+
+@pytest.mark.anyio
+async def test_refresh_picks_up_old_dated_inserts(api):
+    # Another worker imports tracks dated long before anything already indexed
+    await server.db.audio_metadata.insert_many([track("first", "First Song"), track("second", "Second Song", age_days=1)])
+    search_index = SearchIndex()
+    await search_index.load()
+    await server.db.audio_metadata.insert_many([
+        track("imported", "Imported Song", age_days=3650),
+        track("slow", "Slow Song", age_days=2),
+    ])
+    await search_index.refresh()
+    assert ids(search_index.search("song", 0, 10)) == ["first", "second", "slow", "imported"]
+    await search_index.refresh()
+    assert len(search_index) == 4